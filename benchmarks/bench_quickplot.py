@@ -0,0 +1,180 @@
+import shutil
+import tempfile
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+from .common import load, grid_map, grid_lines, point_cloud
+
+from geog88 import quickplot as qp
+from geog88 import classify
+from geog88 import hexbin
+from geog88 import tiles
+
+# The drawing paths of quickplot, from pulling coordinates out of the
+# geometries to a finished render, on the bundled layers and on synthetic
+# grids and point clouds of growing size. Every time_* that draws clears
+# the figure first, so a repeat draws one layer and not every layer drawn
+# by the repeats before it
+
+
+class PolygonRender(object):
+    params = [1000, 10000, 100000, 1000000]
+    param_names = ['cells']
+
+    def setup(self, cells):
+        self.e_map = grid_map(cells)
+        self.buffers = qp.polygon_buffers(self.e_map.geometry)
+        self.fig = plt.figure()
+
+    def teardown(self, cells):
+        plt.close(self.fig)
+
+    def time_polygon_buffers(self, cells):
+        qp.polygon_buffers(self.e_map.geometry)
+
+    def time_polygon_paths(self, cells):
+        qp.polygon_paths(*self.buffers[:3])
+
+    def time_plot_polygons(self, cells):
+        self.fig.clf()
+        qp.plot_polygons(self.e_map, column='goppc', cmap='RdBu_r', linewidth=0.1)
+
+    def time_render(self, cells):
+        self.fig.clf()
+        qp.plot_polygons(self.e_map, column='goppc', cmap='RdBu_r', linewidth=0.1)
+        self.fig.canvas.draw()
+
+    def time_lod_paths(self, cells):
+        lod = qp.LevelsOfDetail(buffers=self.buffers)
+        lod.paths(lod.level(lod.pixel_size(self.fig.gca(), lod.bounds)))
+
+
+class CountyRender(object):
+    # the 48 state county layer, bulk against the old patch per polygon path
+    params = ['bulk', 'patches']
+    param_names = ['path']
+
+    def setup(self, path):
+        self.counties = load('counties')
+        self.fig = plt.figure()
+
+    def teardown(self, path):
+        plt.close(self.fig)
+
+    def time_quickplot(self, path):
+        self.fig.clf()
+        qp.quickplot(self.counties, column='population', cmap='Greys', bulk=path == 'bulk')
+
+    def time_render(self, path):
+        self.fig.clf()
+        qp.quickplot(self.counties, column='population', cmap='Greys', bulk=path == 'bulk')
+        self.fig.canvas.draw()
+
+
+class LineRender(object):
+    params = ['routes', 1000, 10000, 100000]
+    param_names = ['layer']
+
+    def setup(self, layer):
+        self.lines = load('routes') if layer == 'routes' else grid_lines(layer)
+        self.fig = plt.figure()
+
+    def teardown(self, layer):
+        plt.close(self.fig)
+
+    def time_line_buffers(self, layer):
+        qp.line_buffers(self.lines.geometry)
+
+    def time_render(self, layer):
+        self.fig.clf()
+        qp.quickplot(self.lines, linewidth=0.5)
+        self.fig.canvas.draw()
+
+
+class Classify(object):
+    # class breaks of a skewed column, computed afresh each time (the
+    # cache is cleared) to time the schemes rather than the cache
+    params = [[10000, 100000, 1000000], ['quantiles', 'equal_interval', 'fisher_jenks']]
+    param_names = ['values', 'scheme']
+
+    def setup(self, values, scheme):
+        self.values = np.random.RandomState(0).lognormal(0, 1, values)
+
+    def time_breaks(self, values, scheme):
+        classify.breaks_cache.clear()
+        classify.breaks(self.values, scheme, 7)
+
+    def time_breaks_sampled(self, values, scheme):
+        classify.breaks_cache.clear()
+        classify.breaks(self.values, scheme, 7, sample=10000)
+
+
+class PointDensity(object):
+    # Clouds of more than block points are streamed through one block of
+    # block points over and over, which times the same work without
+    # holding them all
+    params = [100000, 1000000, 10000000, 50000000]
+    param_names = ['points']
+    block = 5000000
+    extent = (-125.0, -66.0, 24.0, 50.0)
+
+    def setup(self, points):
+        self.x, self.y = point_cloud(min(points, self.block), self.extent)
+
+    def time_density_grid(self, points):
+        counts = np.zeros((400, 800), dtype=np.int64)
+        for start in range(0, points, self.block):
+            n = min(self.block, points - start)
+            counts += qp.density_grid(self.x[:n], self.y[:n], self.extent, counts.shape)
+
+    def time_hexbin(self, points):
+        binner = hexbin.HexBinner(0.25)
+        for start in range(0, points, self.block):
+            n = min(self.block, points - start)
+            binner.add(self.x[:n], self.y[:n])
+
+
+class UfoPoints(object):
+    params = ['points', 'density']
+    param_names = ['mode']
+
+    def setup(self, mode):
+        self.ufos = load('ufos')
+        self.fig = plt.figure()
+
+    def teardown(self, mode):
+        plt.close(self.fig)
+
+    def time_render(self, mode):
+        self.fig.clf()
+        qp.plot_points(self.ufos, mode=mode)
+        self.fig.canvas.draw()
+
+
+class TileExport(object):
+    # the county map as a tile pyramid, drawn from scratch and then again
+    # with nothing changed, which only signs the tiles
+    params = [[6, 8], [1, 4]]
+    param_names = ['max_zoom', 'processes']
+    timeout = 600
+
+    def setup(self, max_zoom, processes):
+        self.counties = load('counties')
+        self.directory = tempfile.mkdtemp()
+        self.export(max_zoom, processes)
+
+    def teardown(self, max_zoom, processes):
+        shutil.rmtree(self.directory)
+
+    def export(self, max_zoom, processes):
+        tiles.export_tiles(self.counties, self.directory, zooms=range(max_zoom + 1),
+                           column='population', cmap='Greys', scheme='quantiles',
+                           processes=processes)
+
+    def time_export(self, max_zoom, processes):
+        shutil.rmtree(self.directory)
+        self.export(max_zoom, processes)
+
+    def time_export_unchanged(self, max_zoom, processes):
+        self.export(max_zoom, processes)
@@ -0,0 +1,139 @@
+import numpy as np
+
+from .common import load, grid_map
+
+from geog88 import randomstates as rs
+
+# The random states pipeline stage by stage, graph building, seed
+# selection, apportionment, state totals and whole simulated elections,
+# on the election map of the MAUP notebook and on synthetic grids
+
+
+def election_map(source):
+    if source == 'election':
+        return load('election')
+    return grid_map(source)
+
+
+class GraphBuild(object):
+    params = ['election', 10000, 100000, 1000000]
+    param_names = ['map']
+
+    def setup(self, source):
+        self.e_map = election_map(source)
+
+    def time_make_graph(self, source):
+        rs.make_graph(self.e_map)
+
+
+class Seeds(object):
+    params = ['election', 100000]
+    param_names = ['map']
+
+    def setup(self, source):
+        self.e_map = election_map(source)
+        self.graph = rs.make_graph(self.e_map)
+        rs.seed_index(self.graph)
+
+    def time_get_seeds(self, source):
+        rs.get_seeds(self.e_map, self.graph)
+
+    def time_draw_1000(self, source):
+        rs.seed_index(self.graph).draw(np.random.RandomState(0), 1000)
+
+    def time_draw_1000_weighted(self, source):
+        rs.seed_index(self.graph).draw(np.random.RandomState(0), 1000, method='weighted')
+
+
+class Apportion(object):
+    params = [1, 100, 10000]
+    param_names = ['draws']
+
+    def setup(self, draws):
+        e_map = load('election')
+        self.states = sorted(set(e_map.state))
+        rng = np.random.RandomState(0)
+        totals = e_map.groupby('state').population.sum()[self.states].values
+        self.pops = totals * rng.lognormal(0, 0.5, (draws, len(self.states)))
+
+    def time_apportion(self, draws):
+        for row in self.pops:
+            rs.apportion(row, self.states)
+
+    def time_apportion_batch(self, draws):
+        rs.apportion_batch(self.pops, self.states)
+
+
+class Aggregate(object):
+    params = [1, 100, 1000]
+    param_names = ['assignments']
+
+    def setup(self, assignments):
+        e_map = load('election')
+        self.aggregator = rs.StateAggregator(e_map)
+        data = rs.ensemble_data(e_map, rs.make_graph(e_map))
+        self.codes = np.array([rs.simulate_states(data, rs.draw_rng(0, d))
+                               for d in range(assignments)])
+        self.labels = data['states']
+        self.assignment = np.array(self.labels, dtype=object)[self.codes[0]]
+
+    def time_elections(self, assignments):
+        self.aggregator.elections(self.codes, self.labels)
+
+    def time_states(self, assignments):
+        for codes in self.codes:
+            self.aggregator.states(np.array(self.labels, dtype=object)[codes])
+
+
+class Dissolve(object):
+    # the geometry path, for scale against Aggregate.time_states
+    def setup(self):
+        e_map = load('election')
+        self.aggregator = rs.StateAggregator(e_map)
+        self.assignment = rs.random_states(e_map, rs.make_graph(e_map))
+
+    def time_dissolve(self):
+        self.aggregator.dissolve(self.assignment, statevar='newstate')
+
+
+class Elections(object):
+    params = ['election', 100000]
+    param_names = ['map']
+
+    def setup(self, source):
+        self.e_map = election_map(source)
+        self.graph = rs.make_graph(self.e_map)
+        self.data = rs.ensemble_data(self.e_map, self.graph)
+
+    def time_random_states(self, source):
+        rs.random_states(self.e_map, self.graph)
+
+    def time_simulate_100(self, source):
+        rs.simulate_elections(self.data, list(range(100)), 0)
+
+
+class Ensemble(object):
+    # scaling with the number of worker processes
+    params = [[1, 2, 4, 8], [1000]]
+    param_names = ['processes', 'draws']
+    timeout = 600
+
+    def setup(self, processes, draws):
+        self.e_map = load('election')
+        self.graph = rs.make_graph(self.e_map)
+
+    def time_run_ensemble(self, processes, draws):
+        rs.run_ensemble(self.e_map, self.graph, draws, processes=processes)
+
+
+class FlipChain(object):
+    # steps of the boundary flip chain, for comparison with whole draws
+    params = [10000, 100000]
+    param_names = ['steps']
+
+    def setup(self, steps):
+        self.e_map = load('election')
+        self.graph = rs.make_graph(self.e_map)
+
+    def time_run(self, steps):
+        rs.FlipChain(self.e_map, self.graph, seed=0).run(steps, thin=100)
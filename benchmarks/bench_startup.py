@@ -0,0 +1,42 @@
+import multiprocessing
+import subprocess
+import sys
+
+from .common import root, load
+
+from geog88 import randomstates as rs
+
+# What it costs to get going: a fresh interpreter importing a geog88
+# module, and a pool of worker processes started and given the ensemble
+# data, which every parallel run pays before its first draw
+
+
+class ColdImport(object):
+    # numpy alone is the floor every module pays
+    params = ['numpy', 'geog88.quickplot', 'geog88.randomstates', 'geog88.geoio',
+              'geog88.spatialops', 'geog88.reproject']
+    param_names = ['module']
+
+    def time_import(self, module):
+        subprocess.check_call([sys.executable, '-c', 'import ' + module], cwd=root)
+
+
+class WorkerSpawn(object):
+    params = [['fork', 'spawn'], [1, 4]]
+    param_names = ['start_method', 'processes']
+
+    def setup(self, start_method, processes):
+        if start_method not in multiprocessing.get_all_start_methods():
+            raise NotImplementedError
+        e_map = load('election')
+        self.data = rs.ensemble_data(e_map, rs.make_graph(e_map))
+        # one draw per worker, so every worker has started and run
+        self.tasks = [(chunk, [chunk], 0, 'default') for chunk in range(processes)]
+
+    def time_pool_start(self, start_method, processes):
+        context = multiprocessing.get_context(start_method)
+        pool = context.Pool(processes, initializer=rs._init_worker, initargs=(self.data,))
+        try:
+            pool.map(rs._run_chunk, self.tasks, chunksize=1)
+        finally:
+            pool.terminate()
@@ -0,0 +1,81 @@
+import os
+import sys
+
+import numpy as np
+
+# Shared setup for the benchmarks: the geog88 package on the path, the
+# bundled datasets, and synthetic layers that scale far past them
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root not in sys.path:
+    sys.path.insert(0, root)
+
+import matplotlib
+matplotlib.use('Agg')
+import geopandas as gpd
+import shapely
+
+from geog88 import hexbin
+
+
+# Bundled layers by name, read once per process
+datasets = {
+    'counties': os.path.join(root, 'data', 'election-counties-48.geojson'),
+    'election': os.path.join(root, 'session4', 'election.shp'),
+    'ufos': os.path.join(root, 'data', 'ufos.geojson'),
+    'routes': os.path.join(root, 'session3', 'routes.shp'),
+}
+_loaded = {}
+
+
+def load(name):
+    if name not in _loaded:
+        _loaded[name] = gpd.read_file(datasets[name])
+    return _loaded[name]
+
+
+# A synthetic election map of about n_cells unit squares, get_grid from the
+# MAUP notebook scaled up: the grid is cut into blocks of cells that play
+# the states, one corner cell is 'DC', and every cell gets a lognormal
+# population and a dem/gop split that drifts across the grid, so random
+# states still produce varied elections. Coordinates are whole numbers,
+# so neighbouring squares share their corners exactly
+def grid_map(n_cells, n_blocks=7, seed=0):
+    rng = np.random.RandomState(seed)
+    width = int(round(np.sqrt(n_cells)))
+    height = int(np.ceil(n_cells / float(width)))
+    col, row = np.meshgrid(np.arange(width), np.arange(height), indexing='ij')
+    col, row = col.ravel()[:n_cells], row.ravel()[:n_cells]
+
+    geoms = hexbin.polygons(hexbin.square_corners(col, row, 1))
+    block = (col * n_blocks // width) * n_blocks + row * n_blocks // height
+    state = np.array(['S%02d' % b for b in block], dtype=object)
+    state[0] = 'DC'
+
+    population = np.round(rng.lognormal(8, 1.2, n_cells)) + 1
+    votes = np.round(population * rng.uniform(0.3, 0.6, n_cells))
+    lean = 0.5 + 0.2 * np.sin(col / float(width) * 3 * np.pi) * np.cos(row / float(height) * 2 * np.pi)
+    gop = np.round(votes * np.clip(lean + rng.normal(0, 0.1, n_cells), 0.05, 0.95))
+    dem = votes - gop
+    e_map = gpd.GeoDataFrame({'state': state, 'population': population, 'votes': votes,
+                              'dem': dem, 'gop': gop}, geometry=gpd.GeoSeries(geoms))
+    e_map['goppc'] = e_map.gop / e_map.votes
+    return e_map
+
+
+# The boundaries of a grid_map as a layer of LineStrings
+def grid_lines(n_cells, seed=0):
+    e_map = grid_map(n_cells, seed=seed)
+    if hasattr(shapely, 'boundary'):
+        lines = shapely.boundary(np.asarray(e_map.geometry.values, dtype=object))
+    else:
+        lines = [g.boundary for g in e_map.geometry]
+    return gpd.GeoDataFrame({'goppc': e_map.goppc}, geometry=gpd.GeoSeries(lines))
+
+
+# n uniform random points over extent = (xmin, xmax, ymin, ymax) as x, y
+# arrays
+def point_cloud(n, extent=(-125.0, -66.0, 24.0, 50.0), seed=0):
+    rng = np.random.RandomState(seed)
+    xmin, xmax, ymin, ymax = extent
+    return rng.uniform(xmin, xmax, n), rng.uniform(ymin, ymax, n)
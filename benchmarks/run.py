@@ -0,0 +1,267 @@
+import argparse
+import datetime
+import importlib
+import itertools
+import json
+import math
+import os
+import platform
+import re
+import subprocess
+import sys
+import timeit
+
+import numpy as np
+
+# Runs the benchmarks in this directory and keeps the timings per commit
+#
+#   python -m benchmarks.run --quick                 # smallest sizes only
+#   python -m benchmarks.run -b PolygonRender        # one class, every size
+#   python -m benchmarks.run --compare 5cbab2a       # and flag regressions
+#   python -m benchmarks.run --report                # scaling tables, no run
+#
+# The benchmark classes follow asv's conventions (params, param_names,
+# setup/teardown and time_* methods), so asv can run them as they are.
+# Results go to benchmarks/results/<commit>.json, one entry per benchmark
+# and parameter combination, which is what the scaling tables are read from
+
+here = os.path.dirname(os.path.abspath(__file__))
+results_dir = os.path.join(here, 'results')
+
+# a benchmark is flagged when its best time grows by more than this factor,
+# unless its class sets its own regression_threshold
+default_threshold = 1.25
+
+
+def commit_id():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                         cwd=here).decode().strip()
+        dirty = subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                        cwd=here).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if dirty else '')
+
+
+def machine():
+    return {'python': platform.python_version(), 'numpy': np.__version__,
+            'platform': platform.platform(), 'cpus': os.cpu_count()}
+
+
+# Every (name, class, method) in the bench_* modules, name being
+# module.Class.method as asv has it
+def discover(pattern=None):
+    found = []
+    for filename in sorted(os.listdir(here)):
+        if not (filename.startswith('bench_') and filename.endswith('.py')):
+            continue
+        module = importlib.import_module('benchmarks.' + filename[:-3])
+        for cls_name in sorted(vars(module)):
+            cls = getattr(module, cls_name)
+            if not isinstance(cls, type) or cls.__module__ != module.__name__:
+                continue
+            for method in sorted(m for m in vars(cls) if m.startswith('time_')):
+                name = '%s.%s.%s' % (filename[:-3], cls_name, method)
+                if pattern is None or re.search(pattern, name):
+                    found.append((name, cls, method))
+    return found
+
+
+# The parameter combinations of a class: params is one list of values or,
+# with several param_names, a list of lists combined every way. quick keeps
+# only the first (smallest) value of each
+def combinations(cls, quick=False):
+    params = getattr(cls, 'params', None)
+    names = list(getattr(cls, 'param_names', []))
+    if params is None:
+        return [()], []
+    if len(names) <= 1:
+        params = [params]
+    if quick:
+        params = [p[:1] for p in params]
+    return list(itertools.product(*params)), names
+
+
+# Best and median of repeat timings of one call, after a warm-up call.
+# Calls shorter than min_time are looped so each timing is long enough to
+# trust
+def measure(func, repeat=5, min_time=0.05):
+    timer = timeit.default_timer
+    start = timer()
+    func()
+    elapsed = timer() - start
+    number = 1 if elapsed >= min_time else int(math.ceil(min_time / max(elapsed, 1e-6)))
+    times = []
+    for _ in range(repeat if elapsed < 10 else 1):
+        start = timer()
+        for _ in range(number):
+            func()
+        times.append((timer() - start) / number)
+    return {'min': min(times), 'median': float(np.median(times)), 'number': number,
+            'repeat': len(times)}
+
+
+def run(pattern=None, quick=False, repeat=5):
+    results = {}
+    for name, cls, method in discover(pattern):
+        combos, names = combinations(cls, quick)
+        for combo in combos:
+            bench = cls()
+            label = '%s(%s)' % (name, ', '.join(str(v) for v in combo))
+            try:
+                if hasattr(bench, 'setup'):
+                    bench.setup(*combo)
+            except NotImplementedError:
+                # asv's way of skipping a combination
+                continue
+            try:
+                timing = measure(lambda: getattr(bench, method)(*combo), repeat)
+            finally:
+                if hasattr(bench, 'teardown'):
+                    bench.teardown(*combo)
+            timing['params'] = dict(zip(names, combo))
+            timing['threshold'] = getattr(cls, 'regression_threshold', default_threshold)
+            results.setdefault(name, []).append(timing)
+            print('%-70s %10.4f s' % (label, timing['min']))
+            sys.stdout.flush()
+    return results
+
+
+def results_path(commit):
+    if os.path.exists(commit):
+        return commit
+    return os.path.join(results_dir, '%s.json' % commit)
+
+
+def load_results(commit):
+    with open(results_path(commit)) as f:
+        return json.load(f)
+
+
+# Adds results to those already stored for commit, replacing the timings
+# of benchmarks run again
+def save_results(commit, results):
+    path = results_path(commit)
+    if os.path.exists(path):
+        stored = load_results(commit)
+    else:
+        stored = {'commit': commit, 'results': {}}
+    stored['date'] = datetime.datetime.now().isoformat()
+    stored['machine'] = machine()
+    for name, timings in results.items():
+        kept = [t for t in stored['results'].get(name, [])
+                if t['params'] not in [n['params'] for n in timings]]
+        stored['results'][name] = kept + timings
+    if not os.path.isdir(results_dir):
+        os.makedirs(results_dir)
+    with open(path, 'w') as f:
+        json.dump(stored, f, indent=1, sort_keys=True)
+    return path
+
+
+# Ratio of every timing in current to the same benchmark and parameters in
+# baseline. Returns the rows and the number over their threshold
+def compare(baseline, current):
+    rows = []
+    regressions = 0
+    for name in sorted(current['results']):
+        before = dict((json.dumps(t['params'], sort_keys=True), t)
+                      for t in baseline['results'].get(name, []))
+        for timing in current['results'][name]:
+            old = before.get(json.dumps(timing['params'], sort_keys=True))
+            if old is None:
+                continue
+            ratio = timing['min'] / old['min']
+            flag = ''
+            if ratio > timing.get('threshold', default_threshold):
+                flag = 'SLOWER'
+                regressions += 1
+            elif ratio < 1.0 / timing.get('threshold', default_threshold):
+                flag = 'faster'
+            rows.append((name, timing['params'], old['min'], timing['min'], ratio, flag))
+    return rows, regressions
+
+
+# named cases first, then sizes in increasing order
+def _params_key(timing):
+    return [(0, str(v), 0) if isinstance(v, str) else (1, '', v)
+            for _, v in sorted(timing['params'].items())]
+
+
+# Growth exponent of timing along each numeric parameter, against the
+# timing with the next smaller value of that parameter and the same value
+# of every other one. Returns (parameter, exponent) pairs
+def _slopes(timings, timing):
+    params = timing['params']
+    slopes = []
+    for key in sorted(params):
+        size = params[key]
+        if not isinstance(size, (int, float)):
+            continue
+        smaller = [t for t in timings
+                   if isinstance(t['params'].get(key), (int, float)) and t['params'][key] < size
+                   and all(t['params'].get(k) == v for k, v in params.items() if k != key)]
+        if not smaller:
+            continue
+        before = max(smaller, key=lambda t: t['params'][key])
+        if before['min'] > 0 and timing['min'] > 0:
+            slopes.append((key, math.log(timing['min'] / before['min']) /
+                           math.log(float(size) / before['params'][key])))
+    return slopes
+
+
+# Scaling table of each benchmark: time against every parameter value and,
+# for numeric parameters, the growth exponent between neighbouring values
+# with the other parameters held fixed (1 is linear, 2 quadratic; against
+# processes, -1 is a perfect speedup and 0 none)
+def report(stored):
+    for name in sorted(stored['results']):
+        timings = sorted(stored['results'][name], key=_params_key)
+        print(name)
+        for timing in timings:
+            params = timing['params']
+            slopes = _slopes(timings, timing)
+            if len(params) == 1:
+                slope = ' '.join('x^%.2f' % s for _, s in slopes)
+            else:
+                slope = ' '.join('%s x^%.2f' % ks for ks in slopes)
+            print('    %-40s %10.4f s   %s' % (', '.join('%s=%s' % kv for kv in sorted(params.items())),
+                                              timing['min'], slope))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the geography-88 benchmarks.')
+    parser.add_argument('-b', '--bench', help='regular expression picking benchmarks by name')
+    parser.add_argument('--quick', action='store_true',
+                        help='only the smallest value of every parameter')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--commit', help='store the results under this id (default: git HEAD)')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='commit id or results file to check these results against')
+    parser.add_argument('--report', action='store_true',
+                        help='print the stored scaling tables without running anything')
+    args = parser.parse_args(argv)
+
+    commit = args.commit or commit_id()
+    if not args.report:
+        results = run(args.bench, args.quick, args.repeat)
+        print('saved to %s' % save_results(commit, results))
+    current = load_results(commit)
+    if args.report:
+        report(current)
+
+    if args.compare:
+        rows, regressions = compare(load_results(args.compare), current)
+        for name, params, old, new, ratio, flag in rows:
+            print('%-60s %-30s %9.4f %9.4f %6.2fx %s' % (
+                name, ', '.join('%s=%s' % kv for kv in sorted(params.items())),
+                old, new, ratio, flag))
+        if regressions:
+            print('%d benchmark(s) slower than their threshold' % regressions)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,20 @@
+# The helper modules of the geography-88 notebooks as one package
+#
+#   from geog88 import quickplot as qp
+#   from geog88 import randomstates as rs
+#
+# quickplot     fast drawing of GeoDataFrames, see quickplot.quickplot
+# classify      choropleth class breaks for quickplot(scheme=...)
+# tiles         layers rendered to XYZ map tiles for web maps
+# randomstates  random redrawings of US states and their elections
+# geoio         a columnar cache and a streaming GeoJSON reader
+# hexbin        hexagonal and square binning of points
+# spatialops    points and lines totalled onto polygons
+# reproject     cached, single-call reprojection of layers
+# profiling     opt-in timing spans and counters
+#
+# Importing any of them loads NumPy and nothing heavier: matplotlib,
+# shapely, pandas, geopandas, pyproj and networkx are imported the first
+# time a function needs them
+
+__version__ = '0.1.0'
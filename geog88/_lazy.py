@@ -0,0 +1,41 @@
+import importlib
+import types
+
+# Stand-ins for modules that are only imported the first time something
+# in them is used, so importing a geog88 module costs NumPy and nothing
+# heavier. Callers that only want apportion, or worker processes that
+# only run simulated elections, never load matplotlib or geopandas
+#
+#   plt = lazy_import('matplotlib.pyplot', globals(), 'plt')
+#
+# On first use the real module takes the stand-in's place in the
+# namespace it was bound in, so later lookups go straight to the module
+
+
+class LazyModule(types.ModuleType):
+    def __init__(self, name, namespace, alias, also=()):
+        types.ModuleType.__init__(self, name)
+        self._namespace = namespace
+        self._alias = alias
+        self._also = also
+
+    def _load(self):
+        module = importlib.import_module(self.__name__)
+        # submodules older versions don't import with the package
+        for name in self._also:
+            importlib.import_module(name)
+        self._namespace[self._alias] = module
+        # anything still holding the stand-in sees the module's contents
+        self.__dict__.update(module.__dict__)
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+# A LazyModule for name, bound as alias in namespace (a module's globals())
+def lazy_import(name, namespace, alias, also=()):
+    return LazyModule(name, namespace, alias, also)
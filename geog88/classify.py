@@ -0,0 +1,159 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+from . import profiling
+
+# Choropleth classification: the class breaks of a column of values for
+# quickplot's scheme= option, as in geopandas' plot(scheme=...)
+#
+#   b = classify.breaks(counties.nPop, 'fisher_jenks', k=5)
+#   classes = classify.classes(counties.nPop, b)
+#
+# Breaks are the upper bounds of the classes, the last one being the
+# maximum, and a value equal to a break falls in the class below it, as in
+# mapclassify. Quantiles and equal intervals are a few NumPy calls;
+# 'fisher_jenks' finds the same optimal classes as Fisher-Jenks (least
+# squared deviation from the class means) with the divide and conquer
+# dynamic programme of Ckmeans.1d.dp, which is O(k n log n) rather than
+# O(k n^2), done one level of the recursion at a time over flat arrays
+
+# computed breaks keyed on (fingerprint of the values, scheme, k, sample)
+# and evicted least recently used first, so recoloring a layer by a column
+# it has been colored by before costs a hash of the column
+breaks_cache = OrderedDict()
+breaks_cache_size = 32
+
+
+def quantiles(values, k):
+    return np.unique(np.percentile(values, np.linspace(100.0 / k, 100, k)))
+
+
+def equal_interval(values, k):
+    vmin, vmax = values.min(), values.max()
+    b = vmin + (vmax - vmin) * np.arange(1, k + 1) / float(k)
+    b[-1] = vmax
+    return np.unique(b)
+
+
+# The optimal classes of sorted values x into k: for q classes and the
+# first i + 1 values, cost[q, i] is the least total squared deviation and
+# first[q, i] the index where the last class starts. The start only moves
+# right as i grows, so each row is filled by solving the middle i of a
+# range and splitting the range, and its candidate starts, in two
+def _ckmeans(x, k):
+    n = len(x)
+    # sums shifted by the median for accuracy
+    shifted = x - x[n // 2]
+    s1 = np.concatenate([[0.0], np.cumsum(shifted)])
+    s2 = np.concatenate([[0.0], np.cumsum(shifted * shifted)])
+
+    def ssq(j, i):
+        # squared deviation of x[j..i] from its mean
+        total = s1[i + 1] - s1[j]
+        return s2[i + 1] - s2[j] - total * total / (i - j + 1)
+
+    cost = np.empty((k, n))
+    first = np.zeros((k, n), dtype=np.int64)
+    cost[0] = ssq(np.zeros(n, dtype=np.int64), np.arange(n))
+    for q in range(1, k):
+        # ranges [imin, imax] of i still to solve, with their candidate starts [jlo, jhi]
+        imin, imax = np.array([q]), np.array([n - 1])
+        jlo, jhi = np.array([q]), np.array([n - 1])
+        while len(imin) > 0:
+            mid = (imin + imax) // 2
+            hi = np.minimum(jhi, mid)
+            lengths = hi - jlo + 1
+            starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+            segment = np.repeat(np.arange(len(mid)), lengths)
+            j = np.arange(lengths.sum()) - starts[segment] + jlo[segment]
+            candidates = cost[q - 1, j - 1] + ssq(j, mid[segment])
+            best = np.minimum.reduceat(candidates, starts)
+            # the first start reaching the least cost in each range
+            hits = np.flatnonzero(candidates == best[segment])
+            hit_segment = segment[hits]
+            at = np.ones(len(hits), dtype=bool)
+            at[1:] = hit_segment[1:] != hit_segment[:-1]
+            best_j = j[hits[at]]
+            cost[q, mid] = best
+            first[q, mid] = best_j
+
+            left = imin <= mid - 1
+            right = mid + 1 <= imax
+            imin, imax, jlo, jhi = (np.concatenate([imin[left], mid[right] + 1]),
+                                    np.concatenate([mid[left] - 1, imax[right]]),
+                                    np.concatenate([jlo[left], best_j[right]]),
+                                    np.concatenate([best_j[left], jhi[right]]))
+
+    ends = []
+    i = n - 1
+    for q in range(k - 1, -1, -1):
+        ends.append(i)
+        i = first[q, i] - 1
+    return x[np.array(ends[::-1])]
+
+
+def fisher_jenks(values, k):
+    x = np.sort(values)
+    k = min(k, len(np.unique(x)))
+    return _ckmeans(x, k)
+
+
+schemes = {
+    'quantiles': quantiles,
+    'equal_interval': equal_interval,
+    'fisher_jenks': fisher_jenks,
+    # the exact optimum, where mapclassify's natural_breaks approximates it
+    'natural_breaks': fisher_jenks,
+    'ckmeans': fisher_jenks,
+}
+
+
+def _fingerprint(values):
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(values).tobytes())
+    return digest.hexdigest()
+
+
+# The breaks of values (any array-like, NaNs ignored) under scheme, one of
+# the names in schemes, for k classes. With sample set, breaks are found
+# from that many values drawn at random (with a fixed seed) and the last
+# break is stretched to the maximum of all of them: for millions of zones
+# the classes barely move and the cost stops growing with n
+def breaks(values, scheme='quantiles', k=5, sample=None):
+    scheme = scheme.lower()
+    if scheme not in schemes:
+        raise ValueError('Unknown scheme %r, expected one of %s' % (scheme, ', '.join(sorted(schemes))))
+    values = np.asarray(values, dtype=float)
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        raise ValueError('No finite values to classify')
+    key = (_fingerprint(values), scheme, k, sample)
+    if key in breaks_cache:
+        breaks_cache.move_to_end(key)
+        profiling.count('breaks cache hits')
+        return breaks_cache[key]
+
+    with profiling.span('classify.' + scheme):
+        if sample is not None and len(values) > sample:
+            rng = np.random.RandomState(0)
+            b = schemes[scheme](values[rng.choice(len(values), sample, replace=False)], k)
+            b[-1] = values.max()
+        else:
+            b = schemes[scheme](values, k)
+        profiling.count('values classified', len(values))
+    breaks_cache[key] = b
+    while len(breaks_cache) > breaks_cache_size:
+        breaks_cache.popitem(last=False)
+    return b
+
+
+# The class (0 to len(b) - 1) of each of values under breaks b, NaN where
+# a value is missing
+def classes(values, b):
+    values = np.asarray(values, dtype=float)
+    out = np.searchsorted(b, values, side='left').astype(float)
+    np.minimum(out, len(b) - 1, out=out)
+    out[~np.isfinite(values)] = np.nan
+    return out
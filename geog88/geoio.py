@@ -0,0 +1,700 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import pickle
+import re
+import shutil
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+from . import quickplot
+from ._lazy import lazy_import
+
+pd = lazy_import('pandas', globals(), 'pd')
+shapely = lazy_import('shapely', globals(), 'shapely', also=['shapely.geometry', 'shapely.wkb'])
+gpd = lazy_import('geopandas', globals(), 'gpd')
+
+# A columnar cache for the course datasets. The first time a file is read
+# it is parsed with gpd.read_file as usual and written out as one .npy file
+# per attribute column, plus the coordinates of every geometry as one flat
+# float64 array with the offset arrays of shapely.to_ragged_array. Later
+# reads memory-map those files, so they cost next to nothing and share
+# pages with every other process reading the same dataset
+#
+#   counties = geoio.read_file('../data/election-counties-48.geojson')
+#
+#   layer = geoio.open_cache('election.shp', columns=['goppc'])
+#   qp.quickplot(layer, column='goppc')   # no shapely objects made at all
+
+
+# Where cached datasets live unless a cache_dir is given. The default is
+# shared by all the sessions, so with validate='hash' the copies of a file
+# in session1-4 are stored only once
+cache_root = os.environ.get('GEOG88_CACHE',
+                            os.path.join(os.path.expanduser('~'), '.cache', 'geography-88'))
+
+# bump when the layout of a cache entry changes
+cache_version = 2
+
+# files that belong to a shapefile and change its contents
+shapefile_parts = ['.shp', '.shx', '.dbf', '.prj', '.cpg']
+
+# shapely type ids (as in shapely.get_type_id) of the geometry kinds kept as
+# flat buffers. Single and multi parts are stored alike, in the multi layout
+kinds = {'point': (0,), 'line': (1, 5), 'polygon': (3, 6)}
+type_ids = {'Point': 0, 'LineString': 1, 'LinearRing': 2, 'Polygon': 3,
+            'MultiPoint': 4, 'MultiLineString': 5, 'MultiPolygon': 6,
+            'GeometryCollection': 7}
+
+
+# The files a dataset is read from: a shapefile with its sidecars, or just
+# the file itself
+def source_files(path):
+    base, ext = os.path.splitext(path)
+    if ext.lower() != '.shp':
+        return [path]
+    return [base + part for part in shapefile_parts if os.path.exists(base + part)]
+
+
+# Cache key of the dataset at path. validate='mtime' trusts the size and
+# modification time of its files, validate='hash' reads them through and
+# hashes their contents, which also matches identical copies of a file
+def cache_key(path, validate='mtime'):
+    digest = hashlib.sha1(str(cache_version).encode())
+    for name in source_files(path):
+        if validate == 'hash':
+            digest.update(os.path.splitext(name)[1].encode())
+            with open(name, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+        elif validate == 'mtime':
+            stat = os.stat(name)
+            digest.update(os.path.abspath(name).encode())
+            digest.update(str((stat.st_size, stat.st_mtime)).encode())
+        else:
+            raise ValueError('validate should be mtime or hash, not %r' % validate)
+    return digest.hexdigest()
+
+
+def _type_ids(geoms):
+    if hasattr(shapely, 'get_type_id'):
+        return shapely.get_type_id(geoms).astype(np.int8)
+    return np.array([-1 if g is None else type_ids[g.geom_type] for g in geoms],
+                    dtype=np.int8)
+
+
+# Flat buffers of geoms, always in the multi layout, made with the same
+# functions quickplot draws from
+def geometry_buffers(geoms, kind):
+    if kind == 'point':
+        x, y = quickplot.point_coords(geoms)
+        return (np.column_stack([x, y]),)
+    if kind == 'line':
+        return quickplot.line_buffers(geoms)
+    return quickplot.polygon_buffers(geoms)
+
+
+# Shapely geometries back from flat buffers. Features that were single
+# Polygons or LineStrings come back as such, and missing ones as None
+def buffers_to_geometries(kind, buffers, types):
+    single = (types == 1) | (types == 3)
+    if hasattr(shapely, 'from_ragged_array'):
+        if kind == 'point':
+            geoms = shapely.points(np.asarray(buffers[0]))
+        else:
+            geom_type = shapely.GeometryType.MULTILINESTRING if kind == 'line' \
+                else shapely.GeometryType.MULTIPOLYGON
+            offsets = tuple(np.asarray(a) for a in buffers[1:])
+            geoms = shapely.from_ragged_array(geom_type, np.asarray(buffers[0]), offsets)
+            one_part = np.diff(offsets[-1]) == 1
+            pick = single & one_part
+            geoms[pick] = shapely.get_geometry(geoms[pick], 0)
+        geoms[types < 0] = None
+        return geoms
+
+    # older shapely: one constructor call per feature
+    coords = np.asarray(buffers[0])
+    geoms = np.empty(len(types), dtype=object)
+    for i in range(len(types)):
+        if types[i] < 0:
+            continue
+        if kind == 'point':
+            geoms[i] = shapely.geometry.Point(coords[i])
+        elif kind == 'line':
+            line_offsets, geom_offsets = buffers[1], buffers[2]
+            lines = [coords[line_offsets[k]:line_offsets[k + 1]]
+                     for k in range(geom_offsets[i], geom_offsets[i + 1])]
+            if single[i] and len(lines) == 1:
+                geoms[i] = shapely.geometry.LineString(lines[0])
+            else:
+                geoms[i] = shapely.geometry.MultiLineString(lines)
+        else:
+            ring_offsets, part_offsets, geom_offsets = buffers[1], buffers[2], buffers[3]
+            polys = []
+            for p in range(geom_offsets[i], geom_offsets[i + 1]):
+                rings = [coords[ring_offsets[r]:ring_offsets[r + 1]]
+                         for r in range(part_offsets[p], part_offsets[p + 1])]
+                polys.append(shapely.geometry.Polygon(rings[0], rings[1:]))
+            if single[i] and len(polys) == 1:
+                geoms[i] = polys[0]
+            else:
+                geoms[i] = shapely.geometry.MultiPolygon(polys)
+    return geoms
+
+
+# An attribute column as an array np.load can memory-map: strings become
+# fixed width unicode, with missing values noted in a separate mask.
+# Returns None for object columns holding anything but strings (lists,
+# arrays, dates), which _column_blobs keeps instead
+def _column_array(values):
+    values = np.asarray(values)
+    if values.dtype.kind != 'O':
+        return values, None
+    missing = np.array([v is None or (np.isscalar(v) and pd.isnull(v)) for v in values],
+                       dtype=bool)
+    if not all(isinstance(v, str) for v in values[~missing]):
+        return None, None
+    strings = np.array(['' if m else v for v, m in zip(values, missing)], dtype=str)
+    return strings, missing if missing.any() else None
+
+
+# An object column pickled value by value, as one byte array and the offsets
+# of each value in it, like the WKB of mixed geometries
+def _column_blobs(values):
+    blobs = [pickle.dumps(v, protocol=2) for v in values]
+    return (np.frombuffer(b''.join(blobs), dtype=np.uint8),
+            np.concatenate([[0], np.cumsum([len(b) for b in blobs])]).astype(np.int64))
+
+
+def _save(directory, name, a):
+    np.save(os.path.join(directory, name + '.npy'), np.ascontiguousarray(a))
+
+
+def _crs_to_json(crs):
+    if crs is None:
+        return None
+    if hasattr(crs, 'to_wkt'):
+        return crs.to_wkt()
+    return crs
+
+
+# Parses the dataset at path with gpd.read_file and writes its cache entry
+# into directory (which must not exist yet). The entry is written to a
+# temporary directory first and renamed into place, so a reader never sees
+# half of one
+def build_cache(path, directory, **kwargs):
+    gdf = gpd.read_file(path, **kwargs)
+    geoms = np.asarray(gdf.geometry.values, dtype=object)
+    types = _type_ids(geoms)
+
+    present = types[types >= 0]
+    kind = 'wkb'
+    for name in ['point', 'line', 'polygon']:
+        if np.isin(present, kinds[name]).all():
+            kind = name
+            break
+
+    parent = os.path.dirname(directory)
+    if not os.path.exists(parent):
+        os.makedirs(parent)
+    tmp = tempfile.mkdtemp(dir=parent, prefix='.building-')
+    try:
+        _save(tmp, 'types', types)
+        if kind == 'wkb':
+            # anything else, collections say, is kept as WKB bytes
+            blobs = [b'' if g is None else g.wkb for g in geoms]
+            _save(tmp, 'wkb', np.frombuffer(b''.join(blobs), dtype=np.uint8))
+            _save(tmp, 'wkb_offsets', np.concatenate([[0], np.cumsum([len(b) for b in blobs])]))
+            n_buffers = 0
+        else:
+            buffers = geometry_buffers(geoms, kind)
+            for i, a in enumerate(buffers):
+                _save(tmp, 'geometry_%d' % i, a)
+            n_buffers = len(buffers)
+
+        columns = []
+        for i, name in enumerate(c for c in gdf.columns if c != gdf.geometry.name):
+            values, missing = _column_array(gdf[name])
+            if values is None:
+                blob, offsets = _column_blobs(gdf[name])
+                _save(tmp, 'column_%d' % i, blob)
+                _save(tmp, 'column_%d_offsets' % i, offsets)
+            else:
+                _save(tmp, 'column_%d' % i, values)
+            if missing is not None:
+                _save(tmp, 'column_%d_missing' % i, missing)
+            columns.append({'name': name, 'file': 'column_%d' % i,
+                            'missing': missing is not None, 'pickled': values is None})
+
+        meta = {'version': cache_version,
+                'source': os.path.abspath(path),
+                'kind': kind,
+                'n_buffers': n_buffers,
+                'length': len(gdf),
+                'crs': _crs_to_json(gdf.crs),
+                'columns': columns}
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        os.rename(tmp, directory)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not os.path.exists(os.path.join(directory, 'meta.json')):
+            raise
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+# Removes the entries cached for earlier versions of the file at path
+def _prune(cache_dir, path, keep):
+    source = os.path.abspath(path)
+    prefix = os.path.basename(path) + '-'
+    for name in os.listdir(cache_dir):
+        entry = os.path.join(cache_dir, name)
+        if not name.startswith(prefix) or entry == keep:
+            continue
+        try:
+            with open(os.path.join(entry, 'meta.json')) as f:
+                if json.load(f)['source'] == source:
+                    shutil.rmtree(entry, ignore_errors=True)
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+
+
+# Directory of the up to date cache entry for path, building it if needed
+def cache_entry(path, cache_dir=None, validate='mtime', **kwargs):
+    if cache_dir is None:
+        cache_dir = cache_root
+    key = cache_key(path, validate)
+    directory = os.path.join(cache_dir, '%s-%s' % (os.path.basename(path), key[:16]))
+    if not os.path.exists(os.path.join(directory, 'meta.json')):
+        build_cache(path, directory, **kwargs)
+        _prune(cache_dir, path, directory)
+    return directory
+
+
+class ArrayLayer(object):
+    # A layer held as flat arrays: the geometry buffers of one kind
+    # ('point', 'line' or 'polygon'), the shapely type id of every feature
+    # (-1 where it has none) and its attribute columns. It can be handed to
+    # quickplot in place of a GeoDataFrame: columns are looked up with
+    # layer[name], and the bulk drawing paths take their coordinates from
+    # ragged_buffers() instead of from shapely geometries
+
+    def __init__(self, kind, buffers, types, columns, crs=None):
+        self.kind = kind
+        self._buffers = buffers
+        self.types = types
+        self._columns = columns
+        self.crs = crs
+        self._geometry = None
+
+    def __len__(self):
+        return len(self.types)
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    def __getitem__(self, name):
+        return self._columns[name]
+
+    # The flat geometry buffers, laid out as quickplot's polygon_buffers,
+    # line_buffers or (for points) a single (n, 2) coordinate array
+    def ragged_buffers(self):
+        return self._buffers
+
+    @property
+    def geometry(self):
+        if self._geometry is None:
+            geoms = buffers_to_geometries(self.kind, self.ragged_buffers(),
+                                          np.asarray(self.types))
+            self._geometry = gpd.GeoSeries(geoms, crs=self.crs)
+        return self._geometry
+
+    # A regular GeoDataFrame of the layer. The columns are copied out of
+    # the arrays, so the frame can be modified freely
+    def to_geodataframe(self):
+        data = pd.DataFrame(OrderedDict((name, np.array(self[name])) for name in self.columns),
+                            columns=self.columns)
+        return gpd.GeoDataFrame(data, geometry=self.geometry, crs=self.crs)
+
+
+class CachedLayer(ArrayLayer):
+    # A cached dataset, with every array memory-mapped read only and the
+    # attribute columns loaded the first time they are used
+
+    def __init__(self, directory, columns=None):
+        self.directory = directory
+        with open(os.path.join(directory, 'meta.json')) as f:
+            self.meta = json.load(f)
+        ArrayLayer.__init__(self, self.meta['kind'], None, self._load('types'),
+                            _Columns(self, columns), self.meta['crs'])
+
+    def _load(self, name):
+        return np.load(os.path.join(self.directory, name + '.npy'), mmap_mode='r')
+
+    def ragged_buffers(self):
+        if self.kind == 'wkb':
+            raise ValueError('%s has mixed geometry types, no flat buffers are kept'
+                             % self.meta['source'])
+        if self._buffers is None:
+            self._buffers = tuple(self._load('geometry_%d' % i)
+                                  for i in range(self.meta['n_buffers']))
+        return self._buffers
+
+    @property
+    def geometry(self):
+        if self._geometry is None and self.kind == 'wkb':
+            data = self._load('wkb')
+            offsets = self._load('wkb_offsets')
+            geoms = np.empty(len(self), dtype=object)
+            for i in range(len(self)):
+                if self.types[i] >= 0:
+                    geoms[i] = shapely.wkb.loads(data[offsets[i]:offsets[i + 1]].tobytes())
+            self._geometry = gpd.GeoSeries(geoms, crs=self.crs)
+        return ArrayLayer.geometry.fget(self)
+
+
+class _Columns(object):
+    # The attribute columns of a CachedLayer, loaded on first use
+
+    def __init__(self, layer, names=None):
+        self.layer = layer
+        self.files = dict((c['name'], c) for c in layer.meta['columns'])
+        if names is None:
+            names = [c['name'] for c in layer.meta['columns']]
+        for name in names:
+            if name not in self.files:
+                raise KeyError(name)
+        self.names = names
+        self.loaded = {}
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __getitem__(self, name):
+        if name not in self.names:
+            raise KeyError(name)
+        if name not in self.loaded:
+            column = self.files[name]
+            values = self.layer._load(column['file'])
+            if column.get('pickled'):
+                offsets = self.layer._load(column['file'] + '_offsets')
+                data, values = values, np.empty(len(offsets) - 1, dtype=object)
+                for i in range(len(values)):
+                    values[i] = pickle.loads(data[offsets[i]:offsets[i + 1]].tobytes())
+            elif column['missing']:
+                values = np.array(values, dtype=object)
+                values[self.layer._load(column['file'] + '_missing')] = None
+            self.loaded[name] = values
+        return self.loaded[name]
+
+
+# Opens the cached copy of the dataset at path, building it the first time
+# or whenever the source has changed, and returns it as a CachedLayer.
+# columns limits the attribute columns to the ones listed, and any other
+# keyword arguments go to gpd.read_file when the cache is built
+def open_cache(path, columns=None, cache_dir=None, validate='mtime', **kwargs):
+    return CachedLayer(cache_entry(path, cache_dir, validate, **kwargs), columns)
+
+
+# A drop-in for gpd.read_file that goes through the cache
+def read_file(path, columns=None, cache_dir=None, validate='mtime', **kwargs):
+    return open_cache(path, columns, cache_dir, validate, **kwargs).to_geodataframe()
+
+
+# Streaming GeoJSON
+#
+# A FeatureCollection of any size can be read a batch of features at a
+# time. Features are decoded one by one as the file is read, those outside
+# bbox are dropped straight away and only the requested properties are
+# kept, so memory depends on the batch size and not on the file
+#
+#   reader = geoio.GeoJSONReader('earthquakes.geojson', bbox=(-100, -65, -50, 15),
+#                                columns=['EQ_PRIMARY', 'FOCAL_DEPTH'])
+#   for batch in reader.batches(100000):
+#       ...
+#   quakes = reader.read()
+
+_separators = re.compile(r'[\s,]*')
+_features_key = re.compile(r'"features"\s*:\s*\[')
+_epsg_name = re.compile(r'EPSG:+(\d+)', re.IGNORECASE)
+
+# GeoJSON geometry types by the kind of layer they go into
+geojson_kinds = {'Point': 'point', 'LineString': 'line', 'MultiLineString': 'line',
+                 'Polygon': 'polygon', 'MultiPolygon': 'polygon'}
+
+
+# The parts of a GeoJSON geometry as coordinate arrays, nested as the
+# buffers are: a point, a list of lines, or a list of polygons each a list
+# of rings. Z values are dropped
+def _geojson_parts(geometry):
+    kind = geometry['type']
+    coordinates = geometry['coordinates']
+    if kind == 'Point':
+        if len(coordinates) == 0:
+            return np.full(2, np.nan)
+        return np.array(coordinates[:2], dtype=float)
+    if kind == 'LineString':
+        coordinates = [coordinates]
+    elif kind == 'Polygon':
+        return [[np.array(ring, dtype=float)[:, :2] for ring in coordinates]]
+    if kind == 'MultiPolygon':
+        return [[np.array(ring, dtype=float)[:, :2] for ring in poly] for poly in coordinates]
+    return [np.array(line, dtype=float)[:, :2] for line in coordinates]
+
+
+def _parts_bounds(kind, parts):
+    if kind == 'point':
+        return parts[0], parts[1], parts[0], parts[1]
+    if kind == 'polygon':
+        # the exteriors bound the holes
+        parts = [poly[0] for poly in parts if len(poly) > 0]
+    if len(parts) == 0:
+        return np.inf, np.inf, -np.inf, -np.inf
+    coords = np.concatenate(parts)
+    return coords[:, 0].min(), coords[:, 1].min(), coords[:, 0].max(), coords[:, 1].max()
+
+
+# Flat buffers in the multi layout from the parts of a batch of features
+def _parts_buffers(kind, parts):
+    if kind == 'point':
+        if len(parts) == 0:
+            return (np.zeros((0, 2)),)
+        return (np.array([np.full(2, np.nan) if p is None else p for p in parts]),)
+    lines = []
+    part_sizes = []
+    if kind == 'line':
+        for p in parts:
+            p = p or []
+            lines.extend(p)
+            part_sizes.append(len(p))
+        line_sizes = [len(line) for line in lines]
+        offsets = [line_sizes, part_sizes]
+    else:
+        ring_sizes, rings_per_part = [], []
+        for p in parts:
+            p = p or []
+            for poly in p:
+                lines.extend(poly)
+                ring_sizes.extend(len(ring) for ring in poly)
+                rings_per_part.append(len(poly))
+            part_sizes.append(len(p))
+        offsets = [ring_sizes, rings_per_part, part_sizes]
+    coords = np.concatenate(lines) if len(lines) > 0 else np.zeros((0, 2))
+    return (coords,) + tuple(np.concatenate([[0], np.cumsum(sizes, dtype=np.int64)])
+                             for sizes in offsets)
+
+
+class GeoJSONReader(object):
+    # Reads the features of a GeoJSON FeatureCollection incrementally.
+    # bbox = (minx, miny, maxx, maxy) keeps the features whose bounds meet
+    # it, as gpd.read_file(bbox=...) does, and columns names the properties
+    # to keep (all of them by default). A name in columns that no feature
+    # has raises KeyError once the file has been read through, as
+    # gpd.read_file(columns=...) does. Files ending in .gz are read
+    # through gzip
+
+    def __init__(self, path, bbox=None, columns=None, block_size=1 << 20):
+        self.path = path
+        self.bbox = bbox
+        self.columns = columns
+        self.block_size = block_size
+        self.crs = None
+
+    def _open(self):
+        if self.path.endswith('.gz'):
+            return gzip.open(self.path, 'rt', encoding='utf-8')
+        return io.open(self.path, encoding='utf-8')
+
+    # Yields the raw features that pass the bbox, as (kind, parts,
+    # properties) with properties already cut down to the wanted columns
+    def features(self):
+        decoder = json.JSONDecoder()
+        with self._open() as f:
+            buf = ''
+            while True:
+                match = _features_key.search(buf)
+                if match is not None:
+                    break
+                more = f.read(self.block_size)
+                if not more:
+                    raise ValueError('%s is not a GeoJSON FeatureCollection' % self.path)
+                buf += more
+            self.crs = self._header_crs(buf[:match.start()])
+            pos = match.end()
+            # wanted columns not yet found in any feature, bbox or not
+            unseen = set(self.columns) if self.columns is not None else set()
+
+            while True:
+                pos = _separators.match(buf, pos).end()
+                if pos == len(buf):
+                    more = f.read(self.block_size)
+                    if not more:
+                        raise ValueError('%s ends inside its features' % self.path)
+                    buf, pos = buf[pos:] + more, 0
+                    continue
+                if buf[pos] == ']':
+                    if unseen:
+                        raise KeyError('%s has no properties named %s'
+                                       % (self.path, ', '.join(sorted(unseen))))
+                    return
+                try:
+                    feature, end = decoder.raw_decode(buf, pos)
+                except ValueError:
+                    # a feature cut off by the end of the buffer: read on,
+                    # at least doubling what is held so big ones take few tries
+                    more = f.read(max(self.block_size, len(buf) - pos))
+                    if not more:
+                        raise
+                    buf, pos = buf[pos:] + more, 0
+                    continue
+                pos = end
+                if pos > self.block_size:
+                    buf, pos = buf[pos:], 0
+
+                if unseen:
+                    unseen.difference_update(feature.get('properties') or ())
+                kept = self._filter(feature)
+                if kept is not None:
+                    yield kept
+
+    def _header_crs(self, header):
+        start = header.find('"crs"')
+        if start >= 0:
+            start = header.index(':', start) + 1
+            start = _separators.match(header, start).end()
+            try:
+                crs = json.JSONDecoder().raw_decode(header, start)[0]
+                match = _epsg_name.search(crs['properties']['name'])
+                if match is not None:
+                    return 'epsg:' + match.group(1)
+            except (ValueError, KeyError, TypeError):
+                pass
+        # the GeoJSON default
+        return 'epsg:4326'
+
+    def _filter(self, feature):
+        geometry = feature.get('geometry')
+        if geometry is None:
+            kind, parts = None, None
+        else:
+            kind = geojson_kinds.get(geometry['type'], 'other')
+            if kind == 'other':
+                parts = shapely.geometry.shape(geometry)
+            else:
+                parts = _geojson_parts(geometry)
+
+        if self.bbox is not None:
+            if kind is None:
+                return None
+            if kind == 'other':
+                bounds = parts.bounds
+            else:
+                bounds = _parts_bounds(kind, parts)
+            xmin, ymin, xmax, ymax = self.bbox
+            if bounds[0] > xmax or bounds[2] < xmin or bounds[1] > ymax or bounds[3] < ymin:
+                return None
+            inside = bounds[0] >= xmin and bounds[2] <= xmax and bounds[1] >= ymin and bounds[3] <= ymax
+            if not inside and kind != 'point':
+                # straddles an edge of bbox: test the geometry itself
+                box = shapely.geometry.box(xmin, ymin, xmax, ymax)
+                if not shapely.geometry.shape(geometry).intersects(box):
+                    return None
+
+        properties = feature.get('properties') or {}
+        if self.columns is not None:
+            properties = dict((name, properties.get(name)) for name in self.columns)
+        type_id = -1 if geometry is None else type_ids.get(geometry['type'], 7)
+        return kind, type_id, parts, properties
+
+    # Yields the kept features batch_size at a time as ArrayLayers, or as
+    # GeoDataFrames with frames=True
+    def batches(self, batch_size=100000, frames=False):
+        batch = []
+        empty = True
+        for feature in self.features():
+            batch.append(feature)
+            if len(batch) == batch_size:
+                yield self._batch(batch, frames)
+                batch = []
+                empty = False
+        if len(batch) > 0 or empty:
+            yield self._batch(batch, frames)
+
+    def _batch(self, batch, frames):
+        if len(batch) > 0:
+            batch_kinds, types, parts, properties = zip(*batch)
+        else:
+            batch_kinds, types, parts, properties = (), (), (), ()
+        names = self.columns
+        if names is None:
+            names = []
+            for p in properties:
+                names.extend(name for name in p if name not in names)
+        # pandas settles the dtypes, and leaves list valued properties whole
+        columns = OrderedDict((name, pd.Series([p.get(name) for p in properties]).values)
+                              for name in names)
+        types = np.array(types, dtype=np.int8)
+
+        present = set(kind for kind in batch_kinds if kind is not None)
+        if len(present) > 1 or 'other' in present:
+            if not frames:
+                raise ValueError('%s mixes geometry types, read it with frames=True'
+                                 % self.path)
+            geoms = [None if kind is None else
+                     parts[i] if kind == 'other' else
+                     buffers_to_geometries(kind, _parts_buffers(kind, [parts[i]]), types[i:i + 1])[0]
+                     for i, kind in enumerate(batch_kinds)]
+            data = pd.DataFrame(columns, columns=names)
+            return gpd.GeoDataFrame(data, geometry=gpd.GeoSeries(geoms), crs=self.crs)
+
+        kind = present.pop() if present else 'point'
+        layer = ArrayLayer(kind, _parts_buffers(kind, parts), types, columns, self.crs)
+        if frames:
+            return layer.to_geodataframe()
+        return layer
+
+    # Reads the whole selection at once, as one GeoDataFrame or (with
+    # frames=False) one ArrayLayer
+    def read(self, frames=True, batch_size=100000):
+        batches = list(self.batches(batch_size, frames))
+        if frames:
+            if len(batches) == 1:
+                return batches[0]
+            return gpd.GeoDataFrame(pd.concat(batches, ignore_index=True), crs=self.crs)
+        return concat_layers(batches)
+
+
+# Joins ArrayLayers of the same kind end to end
+def concat_layers(layers):
+    if len(layers) == 1:
+        return layers[0]
+    first = layers[0]
+    kind = first.kind
+    buffers = [layer.ragged_buffers() for layer in layers]
+    # every offset array restarts at 0 in each layer: shift it by the
+    # length of what it indexes into in the layers before
+    joined = [np.concatenate([b[0] for b in buffers])]
+    for level in range(1, len(buffers[0])):
+        shift = np.cumsum([0] + [len(b[level - 1]) - (1 if level > 1 else 0) for b in buffers[:-1]])
+        joined.append(np.concatenate([[0]] + [b[level][1:] + s for b, s in zip(buffers, shift)]))
+    names = []
+    for layer in layers:
+        names.extend(name for name in layer.columns if name not in names)
+    columns = OrderedDict((name, np.concatenate([
+        layer[name] if name in layer.columns else np.full(len(layer), None, dtype=object)
+        for layer in layers])) for name in names)
+    types = np.concatenate([layer.types for layer in layers])
+    return ArrayLayer(kind, tuple(joined), types, columns, first.crs)
+
+
+# Reads a GeoJSON FeatureCollection with the features filtered to bbox and
+# the properties to columns as they are parsed (see GeoJSONReader)
+def read_geojson(path, bbox=None, columns=None, frames=True, batch_size=100000):
+    return GeoJSONReader(path, bbox, columns).read(frames, batch_size)
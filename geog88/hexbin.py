@@ -0,0 +1,229 @@
+import math
+
+import numpy as np
+
+from ._lazy import lazy_import
+
+shapely = lazy_import('shapely', globals(), 'shapely', also=['shapely.geometry'])
+gpd = lazy_import('geopandas', globals(), 'gpd')
+
+# Hexagonal and square binning of points with plain NumPy arithmetic,
+# no matplotlib involved. Points can be added a chunk at a time, so a feed
+# of any length is binned in memory that depends only on the number of
+# occupied cells
+#
+#   binner = HexBinner(size=1.0)
+#   for chunk in chunks:
+#       binner.add(chunk.geometry)
+#   hexes = binner.to_geodataframe(crs=chunk.crs)
+
+
+# pack two int64 cell coordinates into one uint64 key, and back
+def _pack(i, j):
+    i = (np.asarray(i, dtype=np.int64) + 2 ** 31).astype(np.uint64)
+    j = (np.asarray(j, dtype=np.int64) + 2 ** 31).astype(np.uint64)
+    return (i << np.uint64(32)) | j
+
+
+def _unpack(keys):
+    i = (keys >> np.uint64(32)).astype(np.int64) - 2 ** 31
+    j = (keys & np.uint64(2 ** 32 - 1)).astype(np.int64) - 2 ** 31
+    return i, j
+
+
+# Axial (q, r) coordinates of the pointy-topped hexagon of circumradius
+# size containing each point, on a lattice with a hexagon centred on
+# origin. Fractional cube coordinates are rounded, and the component
+# that moved most is rebuilt from the other two
+def hex_index(x, y, size, origin=(0, 0)):
+    x = (np.asarray(x, dtype=float) - origin[0]) / size
+    y = (np.asarray(y, dtype=float) - origin[1]) / size
+    q = math.sqrt(3) / 3 * x - y / 3
+    r = 2 * y / 3
+    s = -q - r
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    return rq.astype(np.int64), rr.astype(np.int64)
+
+
+# Centres of the hexagons at axial coordinates (q, r)
+def hex_centers(q, r, size, origin=(0, 0)):
+    x = origin[0] + size * math.sqrt(3) * (q + r / 2.0)
+    y = origin[1] + size * 1.5 * r
+    return x, y
+
+
+# Offset (column, row) coordinates of the hexagons at axial (q, r), with
+# odd rows shifted half a hexagon right, and back: a rectangle of these is
+# a rectangle of hexagons on the map, where one of (q, r) is a rhombus
+def hex_to_offset(q, r):
+    r = np.asarray(r)
+    return np.asarray(q) + r // 2, r
+
+
+def hex_from_offset(col, row):
+    row = np.asarray(row)
+    return np.asarray(col) - row // 2, row
+
+
+# Corners of the hexagons at axial coordinates (q, r), as an (n, 7, 2)
+# array of closed rings
+def hex_corners(q, r, size, origin=(0, 0)):
+    x, y = hex_centers(np.asarray(q), np.asarray(r), size, origin)
+    angles = np.radians(30 + 60 * np.arange(7))
+    return np.stack([x[:, None] + size * np.cos(angles),
+                     y[:, None] + size * np.sin(angles)], axis=-1)
+
+
+# squares are indexed by (column, row) already
+def _identity(col, row):
+    return np.asarray(col), np.asarray(row)
+
+
+# (column, row) of the square of side size containing each point, on a
+# grid with a corner at origin
+def square_index(x, y, size, origin=(0, 0)):
+    col = np.floor((np.asarray(x, dtype=float) - origin[0]) / size)
+    row = np.floor((np.asarray(y, dtype=float) - origin[1]) / size)
+    return col.astype(np.int64), row.astype(np.int64)
+
+
+# Corners of the squares at (col, row), as an (n, 5, 2) array of closed rings
+def square_corners(col, row, size, origin=(0, 0)):
+    x0 = origin[0] + size * np.asarray(col, dtype=float)
+    y0 = origin[1] + size * np.asarray(row, dtype=float)
+    dx = np.array([0, 0, 1, 1, 0]) * size
+    dy = np.array([0, 1, 1, 0, 0]) * size
+    return np.stack([x0[:, None] + dx, y0[:, None] + dy], axis=-1)
+
+
+# Shapely Polygons from an (n, k, 2) array of rings, in one call on shapely 2
+def polygons(rings):
+    if hasattr(shapely, 'polygons'):
+        return shapely.polygons(rings)
+    return [shapely.geometry.polygon.Polygon(ring) for ring in rings]
+
+
+def _xy(points, y=None):
+    # a GeoSeries/GeoDataFrame of Points, or separate x and y arrays
+    if y is not None:
+        return np.asarray(points, dtype=float), np.asarray(y, dtype=float)
+    geoms = np.asarray(getattr(points, 'geometry', points), dtype=object)
+    if hasattr(shapely, 'get_x'):
+        return shapely.get_x(geoms), shapely.get_y(geoms)
+    return (np.array([p.x for p in geoms], dtype=float),
+            np.array([p.y for p in geoms], dtype=float))
+
+
+class HexBinner(object):
+    # Accumulates point counts (or summed weights) per hexagon of a lattice
+    # of pointy-topped hexagons of circumradius size. Only occupied cells
+    # are stored, as sorted packed keys and their totals
+
+    index = staticmethod(hex_index)
+    corners = staticmethod(hex_corners)
+    to_offset = staticmethod(hex_to_offset)
+    from_offset = staticmethod(hex_from_offset)
+
+    def __init__(self, size, origin=(0, 0)):
+        self.size = size
+        self.origin = origin
+        self.keys = np.zeros(0, dtype=np.uint64)
+        self.counts = np.zeros(0)
+        self.n = 0
+
+    # Adds a chunk of points, either a GeoSeries/GeoDataFrame of Points or
+    # x and y arrays, optionally with a weight per point
+    def add(self, points, y=None, weights=None):
+        x, y = _xy(points, y)
+        i, j = self.index(x, y, self.size, self.origin)
+        keys, inverse = np.unique(np.concatenate([self.keys, _pack(i, j)]),
+                                  return_inverse=True)
+        if weights is None:
+            weights = np.ones(len(x))
+        totals = np.concatenate([self.counts, np.asarray(weights, dtype=float)])
+        self.counts = np.bincount(inverse.ravel(), weights=totals, minlength=len(keys))
+        self.keys = keys
+        self.n += len(x)
+        return self
+
+    # cell coordinates and totals of the occupied cells
+    def cells(self):
+        i, j = _unpack(self.keys)
+        return i, j, self.counts
+
+    # Every cell of the rows and columns spanned by the occupied cells, with
+    # zero totals for the empty ones, like the block of cells plt.hexbin
+    # reports. Hexagons are filled in offset rows, so the block is the
+    # rectangle around the data, not a rhombus of axial coordinates
+    def filled_cells(self):
+        i, j, counts = self.cells()
+        if len(i) == 0:
+            return i, j, counts
+        col, row = self.to_offset(i, j)
+        cc, rr = np.meshgrid(np.arange(col.min(), col.max() + 1),
+                             np.arange(row.min(), row.max() + 1), indexing='ij')
+        ii, jj = self.from_offset(cc.ravel(), rr.ravel())
+        keys = _pack(ii, jj)
+        order = np.argsort(keys)
+        full = np.zeros(len(ii))
+        full[order[np.searchsorted(keys[order], self.keys)]] = counts
+        return ii, jj, full
+
+    # A GeoDataFrame with one polygon per cell and its total in column 'n',
+    # all cells of the covered block with fill=True
+    def to_geodataframe(self, crs=None, fill=False):
+        i, j, counts = self.filled_cells() if fill else self.cells()
+        cells = gpd.GeoDataFrame(
+            {'n': counts},
+            geometry=gpd.GeoSeries(polygons(self.corners(i, j, self.size, self.origin))))
+        cells.crs = crs
+        return cells
+
+
+class SquareBinner(HexBinner):
+    # The same as HexBinner on a grid of squares with side size
+
+    index = staticmethod(square_index)
+    corners = staticmethod(square_corners)
+    to_offset = staticmethod(_identity)
+    from_offset = staticmethod(_identity)
+
+
+# makes a hexbin GeoDataFrame and also an 'all hexbins' GeoDataFrame
+# from supplied pt layer with the specified nx number of hexes across,
+# like the notebook version but without drawing anything: every hex in
+# the covered block is returned, with its count in 'n', and the extent
+# layer is the bounding box of the hexes, worked out from their corners
+def get_hexbin_map(pt_layer, nx=50):
+    x, y = _xy(pt_layer)
+    x_range = (x.max() - x.min()) * (1 + 1.0 / nx)
+    # nx hexes across: a pointy-topped hex is sqrt(3) * size wide
+    size = x_range / nx / math.sqrt(3)
+    binner = HexBinner(size, origin=(x.min(), y.min())).add(x, y)
+    hexes = binner.to_geodataframe(crs=pt_layer.crs, fill=True)
+
+    xmin, ymin, xmax, ymax = hexes.total_bounds
+    hexes_all = gpd.GeoDataFrame(geometry=gpd.GeoSeries(
+        [shapely.geometry.box(xmin, ymin, xmax, ymax)]))
+    hexes_all.crs = hexes.crs
+    return hexes, hexes_all
+
+
+# Make a width x height grid of squares of side size, as get_grid in the
+# MAUP notebook does, with every square built in one call
+def get_grid(width=10, height=10, noise=0, size=1):
+    col, row = np.meshgrid(np.arange(width), np.arange(height), indexing='ij')
+    col, row = col.ravel(), row.ravel()
+    square_map = gpd.GeoDataFrame(geometry=gpd.GeoSeries(
+        polygons(square_corners(col, row, size))))
+    square_map.crs = 'epsg:4326'
+    square_map['column'] = col
+    square_map['row'] = row
+    square_map['approx_col'] = square_map.column + (noise * np.random.rand(width*height))
+    square_map['approx_row'] = square_map.row + (noise * np.random.rand(width*height))
+    return square_map
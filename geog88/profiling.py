@@ -0,0 +1,196 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Opt-in timing spans and counters for quickplot and randomstates. Off by
+# default, when span() hands back one shared do-nothing context manager
+# and count() returns straight away, so the hooks cost a function call
+#
+#   with profiling.profile() as prof:
+#       rs.run_ensemble(election, G, 1000)
+#   print(prof.summary())
+#   prof.save_chrome_trace('ensemble.json')   # open in chrome://tracing
+#
+# A span records its name, start, duration, the time not spent in spans
+# inside it (self time) and the counters bumped while it was innermost
+
+enabled = False
+
+# finished spans as (name, start, duration, self time, pid, thread,
+# counters), times in seconds from time.perf_counter
+_events = []
+# spans open in this process, innermost last
+_stack = []
+# profile() blocks currently recording
+_profiles = []
+
+
+class _NullSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_null_span = _NullSpan()
+
+
+class _Span(object):
+    def __init__(self, name):
+        self.name = name
+        self.counters = None
+        self.child_time = 0.0
+
+    def __enter__(self):
+        _stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        duration = time.perf_counter() - self.start
+        _stack.pop()
+        if _stack:
+            _stack[-1].child_time += duration
+        _events.append((self.name, self.start, duration, duration - self.child_time,
+                        os.getpid(), threading.current_thread().ident, self.counters))
+        return False
+
+
+# A timing span around a with block, recorded only while profiling is on
+def span(name):
+    if not enabled:
+        return _null_span
+    return _Span(name)
+
+
+# Adds n to counter name, on the innermost open span
+def count(name, n=1):
+    if not enabled:
+        return
+    if not _stack:
+        # counts made outside any span go on an empty span of their own
+        _events.append(('(no span)', time.perf_counter(), 0.0, 0.0, os.getpid(),
+                        threading.current_thread().ident, {name: n}))
+        return
+    target = _stack[-1]
+    if target.counters is None:
+        target.counters = {}
+    target.counters[name] = target.counters.get(name, 0) + n
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = bool(_profiles)
+
+
+def reset():
+    del _events[:]
+
+
+# Turns profiling on in a freshly started worker process, dropping whatever
+# spans a forked worker inherited from its parent
+def start_worker():
+    reset()
+    del _stack[:]
+    enable()
+
+
+# The spans recorded so far, removed from the record. Worker processes
+# hand theirs back this way to be merged into the parent's
+def collect():
+    events = list(_events)
+    reset()
+    return events
+
+
+# Adds spans recorded elsewhere, by collect() in a worker process
+def merge(events):
+    if enabled:
+        _events.extend(events)
+
+
+class Profile(object):
+    # The spans recorded during one profile() block, with the summary
+    # table and Chrome trace export
+
+    def __init__(self, events=None):
+        self.events = events if events is not None else []
+
+    def __enter__(self):
+        global enabled
+        self._start = len(_events)
+        self._was_enabled = enabled
+        _profiles.append(self)
+        enabled = True
+        return self
+
+    def __exit__(self, *exc):
+        global enabled
+        _profiles.pop()
+        self.events = list(_events[self._start:])
+        enabled = self._was_enabled or bool(_profiles)
+        if not enabled:
+            reset()
+        return False
+
+    # One row per span name, in order of total time: calls, total, self
+    # and mean time, and the counters summed over its calls
+    def rows(self):
+        table = OrderedDict()
+        for name, start, duration, self_time, pid, tid, counters in self.events:
+            row = table.get(name)
+            if row is None:
+                row = table[name] = {'span': name, 'calls': 0, 'total': 0.0, 'self': 0.0,
+                                     'max': 0.0, 'counters': OrderedDict()}
+            row['calls'] += 1
+            row['total'] += duration
+            row['self'] += self_time
+            row['max'] = max(row['max'], duration)
+            for key, value in (counters or {}).items():
+                row['counters'][key] = row['counters'].get(key, 0) + value
+        rows = sorted(table.values(), key=lambda r: -r['total'])
+        for row in rows:
+            row['mean'] = row['total'] / row['calls']
+        return rows
+
+    def summary(self):
+        rows = self.rows()
+        lines = ['%-36s %8s %10s %10s %10s  %s' % ('span', 'calls', 'total s', 'self s',
+                                                  'mean ms', 'counters')]
+        for row in rows:
+            counters = ', '.join('%s=%s' % kv for kv in row['counters'].items())
+            lines.append('%-36s %8d %10.4f %10.4f %10.3f  %s' % (
+                row['span'], row['calls'], row['total'], row['self'],
+                row['mean'] * 1000, counters))
+        return '\n'.join(lines)
+
+    # The spans in the Chrome trace event format, which chrome://tracing
+    # and Perfetto open: one complete ('X') event per span, with its
+    # counters as args, and a process per worker
+    def chrome_trace(self):
+        if len(self.events) == 0:
+            return {'traceEvents': []}
+        origin = min(e[1] for e in self.events)
+        trace = []
+        for name, start, duration, self_time, pid, tid, counters in self.events:
+            trace.append({'name': name, 'ph': 'X', 'pid': pid, 'tid': tid,
+                          'ts': (start - origin) * 1e6, 'dur': duration * 1e6,
+                          'args': dict(counters or {})})
+        return {'traceEvents': trace, 'displayTimeUnit': 'ms'}
+
+    def save_chrome_trace(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+
+
+# Records every span and counter in a with block, see Profile
+def profile():
+    return Profile()
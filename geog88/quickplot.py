@@ -0,0 +1,731 @@
+import hashlib
+import math
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+
+from . import classify
+from . import profiling
+from ._lazy import lazy_import
+
+# matplotlib and shapely load when the first layer is drawn
+matplotlib = lazy_import('matplotlib', globals(), 'matplotlib', also=['matplotlib.colors'])
+plt = lazy_import('matplotlib.pyplot', globals(), 'plt')
+mpc = lazy_import('matplotlib.collections', globals(), 'mpc')
+mpatches = lazy_import('matplotlib.patches', globals(), 'mpatches')
+mpath = lazy_import('matplotlib.path', globals(), 'mpath')
+mlines = lazy_import('matplotlib.lines', globals(), 'mlines')
+shapely = lazy_import('shapely', globals(), 'shapely', also=['shapely.geometry'])
+
+
+# Pulls every ring of the Polygon and/or MultiPolygon geometries in geoms
+# into one flat (N, 2) coordinate array plus offset arrays, laid out as in
+# shapely.to_ragged_array: ring_offsets index into coords, part_offsets
+# index into the rings (exterior first, then holes) and geom_offsets index
+# into the polygon parts of each feature
+def polygon_buffers(geoms):
+    geoms = np.asarray(geoms, dtype=object)
+    if hasattr(shapely, 'to_ragged_array'):
+        # shapely 2 does the whole layer in one call
+        geom_type, coords, offsets = shapely.to_ragged_array(geoms)
+        if len(offsets) == 2:
+            ring_offsets, part_offsets = offsets
+            geom_offsets = np.arange(len(geoms) + 1)
+        else:
+            ring_offsets, part_offsets, geom_offsets = offsets
+        return (coords, np.asarray(ring_offsets, dtype=np.int64),
+                np.asarray(part_offsets, dtype=np.int64),
+                np.asarray(geom_offsets, dtype=np.int64))
+
+    # older shapely: walk the geometries once, but still only build arrays
+    coords = []
+    ring_offsets, part_offsets, geom_offsets = [0], [0], [0]
+    for geom in geoms:
+        if geom is None or geom.is_empty:
+            parts = []
+        elif hasattr(geom, 'geoms'):
+            parts = geom.geoms
+        else:
+            parts = [geom]
+        for poly in parts:
+            for ring in [poly.exterior] + list(poly.interiors):
+                a = np.asarray(ring.coords)[:, :2]
+                coords.append(a)
+                ring_offsets.append(ring_offsets[-1] + len(a))
+            part_offsets.append(len(ring_offsets) - 1)
+        geom_offsets.append(len(part_offsets) - 1)
+    if len(coords) > 0:
+        coords = np.concatenate(coords)
+    else:
+        coords = np.zeros((0, 2))
+    return (coords, np.asarray(ring_offsets, dtype=np.int64),
+            np.asarray(part_offsets, dtype=np.int64),
+            np.asarray(geom_offsets, dtype=np.int64))
+
+
+# Makes one compound matplotlib Path per polygon part from flat polygon
+# buffers, so holes are drawn in the same pass as their exterior. Rings are
+# rewound so exteriors run counter-clockwise and holes clockwise, which
+# leaves the holes empty under either fill rule.
+# Returns the paths and the index of the part each path was made from
+# (parts without any rings are dropped)
+def polygon_paths(coords, ring_offsets, part_offsets):
+    starts = ring_offsets[:-1]
+    ends = ring_offsets[1:]
+    lengths = ends - starts
+    n_rings = len(lengths)
+    ring_of_vertex = np.repeat(np.arange(n_rings), lengths)
+
+    # signed area of each ring by the shoelace formula
+    x = coords[:, 0]
+    y = coords[:, 1]
+    cross = np.zeros(len(coords))
+    cross[:-1] = x[:-1] * y[1:] - x[1:] * y[:-1]
+    cross[ends[lengths > 0] - 1] = 0
+    area = np.bincount(ring_of_vertex, weights=cross, minlength=n_rings)
+
+    rings_per_part = np.diff(part_offsets)
+    has_rings = rings_per_part > 0
+    exterior = np.zeros(n_rings, dtype=bool)
+    exterior[part_offsets[:-1][has_rings]] = True
+    flip = (exterior & (area < 0)) | (~exterior & (area > 0))
+
+    idx = np.arange(len(coords))
+    flipped = flip[ring_of_vertex]
+    rs = starts[ring_of_vertex]
+    re = ends[ring_of_vertex]
+    idx = np.where(flipped, rs + re - 1 - idx, idx)
+    verts = coords[idx]
+
+    codes = np.full(len(coords), mpath.Path.LINETO, dtype=mpath.Path.code_type)
+    codes[starts[lengths > 0]] = mpath.Path.MOVETO
+    codes[ends[lengths > 0] - 1] = mpath.Path.CLOSEPOLY
+
+    parts = np.nonzero(has_rings)[0]
+    vstart = ring_offsets[part_offsets[parts]]
+    vend = ring_offsets[part_offsets[parts + 1]]
+    paths = [mpath.Path(verts[a:b], codes[a:b]) for a, b in zip(vstart, vend)]
+    return paths, parts
+
+
+# Simplifies flat polygon buffers for drawing by snapping every vertex to a
+# grid of the given tolerance and dropping vertices that land on the same
+# grid point as the one before. Neighbouring polygons share their boundary
+# vertices, so they snap identically and stay seamless. Rings left with
+# fewer than three distinct vertices are dropped, together with the holes
+# of any polygon part whose exterior went. Returns buffers in the same
+# layout as polygon_buffers
+def snap_polygon_buffers(coords, ring_offsets, part_offsets, geom_offsets, tolerance):
+    q = np.round(coords / tolerance)
+    starts = ring_offsets[:-1]
+    lengths = np.diff(ring_offsets)
+    n_rings = len(lengths)
+    n_parts = len(part_offsets) - 1
+    ring_of_vertex = np.repeat(np.arange(n_rings), lengths)
+    part_of_ring = np.repeat(np.arange(n_parts), np.diff(part_offsets))
+    geom_of_part = np.repeat(np.arange(len(geom_offsets) - 1), np.diff(geom_offsets))
+
+    keep = np.ones(len(q), dtype=bool)
+    keep[1:] = (q[1:] != q[:-1]).any(axis=1)
+    keep[starts[lengths > 0]] = True
+    new_lengths = np.bincount(ring_of_vertex, weights=keep, minlength=n_rings).astype(np.int64)
+
+    keep_ring = new_lengths >= 4
+    exterior = np.zeros(n_rings, dtype=bool)
+    exterior[part_offsets[:-1][np.diff(part_offsets) > 0]] = True
+    keep_part = np.zeros(n_parts, dtype=bool)
+    keep_part[part_of_ring[exterior & keep_ring]] = True
+    keep_ring &= keep_part[part_of_ring]
+    keep &= keep_ring[ring_of_vertex]
+
+    coords = q[keep] * tolerance
+    ring_offsets = np.concatenate([[0], np.cumsum(new_lengths[keep_ring])])
+    rings_per_part = np.bincount(part_of_ring[keep_ring], minlength=n_parts)
+    part_offsets = np.concatenate([[0], np.cumsum(rings_per_part[keep_part])])
+    parts_per_geom = np.bincount(geom_of_part[keep_part], minlength=len(geom_offsets) - 1)
+    geom_offsets = np.concatenate([[0], np.cumsum(parts_per_geom)])
+    return coords, ring_offsets, part_offsets, geom_offsets
+
+
+# simplified paths shared by all layers, keyed on (layer fingerprint, level)
+# and evicted least recently used first
+lod_cache = OrderedDict()
+lod_cache_size = 32
+
+
+class LevelsOfDetail(object):
+    # Holds the full resolution buffers of a polygon layer and hands out
+    # paths simplified for a given pixel size. Tolerances are rounded down
+    # to a power of two so that nearby zoom levels share a cache entry
+
+    def __init__(self, geoms=None, buffers=None):
+        if buffers is None:
+            buffers = polygon_buffers(geoms)
+        self.buffers = buffers
+        digest = hashlib.sha1()
+        for a in self.buffers:
+            digest.update(np.ascontiguousarray(a).tobytes())
+        self.fingerprint = digest.hexdigest()
+        coords = self.buffers[0]
+        if len(coords) > 0:
+            self.bounds = (coords[:, 0].min(), coords[:, 0].max(),
+                           coords[:, 1].min(), coords[:, 1].max())
+        else:
+            self.bounds = (0.0, 1.0, 0.0, 1.0)
+
+    # Size of one screen pixel of ax in data units, over extent
+    # (xmin, xmax, ymin, ymax) or the current view limits
+    def pixel_size(self, ax, extent=None):
+        if extent is None:
+            extent = ax.get_xlim() + ax.get_ylim()
+        xmin, xmax, ymin, ymax = extent
+        bbox = ax.get_window_extent()
+        return max(abs(xmax - xmin) / max(bbox.width, 1),
+                   abs(ymax - ymin) / max(bbox.height, 1))
+
+    def level(self, pixel_size):
+        if pixel_size <= 0:
+            return None
+        return int(math.floor(math.log(pixel_size, 2)))
+
+    # Returns (paths, feature_of_part) for the layer at the given level,
+    # None meaning full resolution
+    def paths(self, level):
+        key = (self.fingerprint, level)
+        if key in lod_cache:
+            lod_cache.move_to_end(key)
+            profiling.count('lod cache hits')
+            return lod_cache[key]
+        if level is None:
+            buffers = self.buffers
+        else:
+            with profiling.span('quickplot.snap_polygon_buffers'):
+                buffers = snap_polygon_buffers(*self.buffers, tolerance=2.0 ** level)
+        coords, ring_offsets, part_offsets, geom_offsets = buffers
+        with profiling.span('quickplot.polygon_paths'):
+            paths, parts = polygon_paths(coords, ring_offsets, part_offsets)
+            profiling.count('parts exploded', len(paths))
+            profiling.count('vertices emitted', len(coords))
+        feature_of_part = np.repeat(np.arange(len(geom_offsets) - 1), np.diff(geom_offsets))[parts]
+        lod_cache[key] = (paths, feature_of_part)
+        while len(lod_cache) > lod_cache_size:
+            lod_cache.popitem(last=False)
+        return paths, feature_of_part
+
+
+def plot_polygons(gdf, column=None, cmap='Set1', facecolor=None, edgecolor=None,
+                            alpha=1.0, linewidth=0.5, bulk=True, **kwargs):
+    # Makes a MatPlotLib PathCollection out of Polygon and/or MultiPolygon geometries
+    # with a single pass over flat coordinate arrays, holes included
+    # bulk=False falls back to the one-patch-per-exterior version below
+    return _plot_polygons(gdf, column, cmap, facecolor, edgecolor,
+                          alpha, linewidth, bulk, **kwargs)[0]
+
+
+def plot_polygon_patches(gdf, column=None, cmap='Set1', facecolor=None, edgecolor=None,
+                            alpha=1.0, linewidth=0.5, **kwargs):
+    # Makes a MatPlotLib PatchCollection out of Polygon and/or MultiPolygon geometries 
+    # Thanks to http://stackoverflow.com/a/33753927
+    return _plot_polygon_patches(gdf, column, cmap, facecolor, edgecolor,
+                                 alpha, linewidth, **kwargs)[0]
+
+
+# Colors a collection by one value per drawn part
+def _set_values(collection, newvals, cmap, norm=None):
+    with profiling.span('quickplot.set_values'):
+        collection.set_array(np.asarray(newvals))
+        collection.set_cmap(cmap)
+        if norm is None:
+            norm = matplotlib.colors.Normalize()
+            norm.autoscale(newvals)
+        collection.set_norm(norm)
+
+
+def _add_collection(collection):
+    with profiling.span('quickplot.add_collection'):
+        plt.gca().add_collection(collection, autolim=True)
+        plt.gca().set_aspect('equal')
+    with profiling.span('quickplot.autoscale_view'):
+        plt.gca().autoscale_view()
+
+
+# The _plot_* functions draw a layer and also return, for every part they
+# drew, the position in gdf of the feature it came from
+def _plot_polygons(gdf, column=None, cmap='Set1', facecolor=None, edgecolor=None,
+                   alpha=1.0, linewidth=0.5, bulk=True, lod=None, **kwargs):
+    if not bulk:
+        return _plot_polygon_patches(gdf, column, cmap, facecolor, edgecolor,
+                                     alpha, linewidth, **kwargs)
+
+    if lod is not None:
+        # simplified to the pixel size the whole layer would be drawn at
+        paths, feature_of_part = lod.paths(lod.level(lod.pixel_size(plt.gca(), lod.bounds)))
+    else:
+        with profiling.span('quickplot.polygon_buffers'):
+            coords, ring_offsets, part_offsets, geom_offsets = layer_buffers(gdf, 'polygon')
+            profiling.count('features processed', len(geom_offsets) - 1)
+        with profiling.span('quickplot.polygon_paths'):
+            paths, parts = polygon_paths(coords, ring_offsets, part_offsets)
+            feature_of_part = np.repeat(np.arange(len(geom_offsets) - 1), np.diff(geom_offsets))[parts]
+            profiling.count('parts exploded', len(paths))
+            profiling.count('vertices emitted', len(coords))
+
+    with profiling.span('quickplot.PathCollection'):
+        patches = mpc.PathCollection(paths, facecolor=facecolor, linewidth=linewidth,
+                                     edgecolor=edgecolor, alpha=alpha, **kwargs)
+    if column is not None:
+        # each part takes the value of the feature it came from
+        _set_values(patches, np.asarray(gdf[column])[feature_of_part], cmap)
+    _add_collection(patches)
+    return patches, feature_of_part
+
+
+def _plot_polygon_patches(gdf, column=None, cmap='Set1', facecolor=None, edgecolor=None,
+                          alpha=1.0, linewidth=0.5, **kwargs):
+    patches = []
+    newvals = []
+    feature_of_part = []
+    geoms = gdf.geometry
+    if column is not None:
+        values = gdf[column]
+    else:
+        values = None
+
+    vertices = 0
+    with profiling.span('quickplot.polygon_patches'):
+        for polynum in range(len(geoms)):
+            poly = geoms.iloc[polynum]
+            if type(poly) != shapely.geometry.polygon.Polygon:
+                for currpoly in poly.geoms:
+                    a = np.asarray(currpoly.exterior.coords)
+                    patches.append(mpatches.Polygon(a))
+                    vertices += len(a)
+                    feature_of_part.append(polynum)
+                    if values is not None:
+                        newvals.append(values.iloc[polynum])
+            else:
+                a = np.asarray(poly.exterior.coords)
+                patches.append(mpatches.Polygon(a))
+                vertices += len(a)
+                feature_of_part.append(polynum)
+                if values is not None:
+                    newvals.append(values.iloc[polynum])
+        profiling.count('features processed', len(geoms))
+        profiling.count('parts exploded', len(patches))
+        profiling.count('vertices emitted', vertices)
+
+    with profiling.span('quickplot.PatchCollection'):
+        patches = mpc.PatchCollection(patches, facecolor=facecolor, linewidth=linewidth,
+                                      edgecolor=edgecolor, alpha=alpha, **kwargs)
+    if values is not None:
+        _set_values(patches, newvals, cmap)
+    _add_collection(patches)
+    return patches, np.asarray(feature_of_part, dtype=np.int64)
+
+
+# Pulls every LineString and MultiLineString part in geoms into one flat
+# (N, 2) coordinate array, with line_offsets indexing into coords and
+# geom_offsets indexing into the parts of each feature. Anything that is
+# not a line contributes no parts, as it was skipped before
+def line_buffers(geoms):
+    geoms = np.asarray(geoms, dtype=object)
+    if hasattr(shapely, 'to_ragged_array'):
+        type_ids = shapely.get_type_id(geoms)
+        # 1 is LineString, 5 is MultiLineString
+        is_line = (type_ids == 1) | (type_ids == 5)
+        if not is_line.any():
+            return (np.zeros((0, 2)), np.zeros(1, dtype=np.int64),
+                    np.zeros(len(geoms) + 1, dtype=np.int64))
+        geom_type, coords, offsets = shapely.to_ragged_array(np.where(is_line, geoms, None))
+        if len(offsets) == 2:
+            line_offsets, geom_offsets = offsets
+        else:
+            # plain LineStrings: one part per line, none for the rest
+            line_offsets = np.concatenate([[0], offsets[0][1:][is_line]])
+            geom_offsets = np.concatenate([[0], np.cumsum(is_line)])
+        return (coords, np.asarray(line_offsets, dtype=np.int64),
+                np.asarray(geom_offsets, dtype=np.int64))
+
+    coords = []
+    line_offsets, geom_offsets = [0], [0]
+    for geom in geoms:
+        if type(geom) == shapely.geometry.multilinestring.MultiLineString:
+            parts = geom.geoms
+        elif type(geom) == shapely.geometry.linestring.LineString:
+            parts = [geom]
+        else:
+            parts = []
+        for line in parts:
+            a = np.asarray(line.coords)[:, :2]
+            coords.append(a)
+            line_offsets.append(line_offsets[-1] + len(a))
+        geom_offsets.append(len(line_offsets) - 1)
+    if len(coords) > 0:
+        coords = np.concatenate(coords)
+    else:
+        coords = np.zeros((0, 2))
+    return (coords, np.asarray(line_offsets, dtype=np.int64),
+            np.asarray(geom_offsets, dtype=np.int64))
+
+
+def plot_lines(gdf, column=None, cmap='Set1', facecolor=None, edgecolor=None,
+                            alpha=1.0, linewidth=0.5, **kwargs):
+    # Makes a MatPlotLib LineCollection out of LineString and/or MultiLineString
+    # geometries, straight from the flat coordinate array of the whole layer
+    return _plot_lines(gdf, column, cmap, facecolor, edgecolor,
+                       alpha, linewidth, **kwargs)[0]
+
+
+def _plot_lines(gdf, column=None, cmap='Set1', facecolor=None, edgecolor=None,
+                alpha=1.0, linewidth=0.5, **kwargs):
+    with profiling.span('quickplot.line_buffers'):
+        coords, line_offsets, geom_offsets = layer_buffers(gdf, 'line')
+        # views into coords, one per line part, no copies made
+        lines = np.split(coords, line_offsets[1:-1]) if len(line_offsets) > 1 else []
+        feature_of_part = np.repeat(np.arange(len(geom_offsets) - 1), np.diff(geom_offsets))
+        profiling.count('features processed', len(geom_offsets) - 1)
+        profiling.count('parts exploded', len(lines))
+        profiling.count('vertices emitted', len(coords))
+
+    with profiling.span('quickplot.LineCollection'):
+        lines = mpc.LineCollection(lines, facecolors='none', linewidth=linewidth,
+                                   edgecolor=edgecolor, alpha=alpha, **kwargs)
+    if column is not None:
+        # each part takes the value of the feature it came from
+        _set_values(lines, np.asarray(gdf[column])[feature_of_part], cmap)
+    _add_collection(lines)
+    return lines, feature_of_part
+
+
+# Returns the x and y coordinates of a layer of Points as two NumPy arrays
+def point_coords(geoms):
+    geoms = np.asarray(geoms, dtype=object)
+    if hasattr(shapely, 'get_x'):
+        return shapely.get_x(geoms), shapely.get_y(geoms)
+    x = np.fromiter((p.x for p in geoms), dtype=float, count=len(geoms))
+    y = np.fromiter((p.y for p in geoms), dtype=float, count=len(geoms))
+    return x, y
+
+
+# Counts the points falling in each cell of a (ny, nx) grid laid over
+# extent = (xmin, xmax, ymin, ymax) with a single bincount, so the cost
+# is one pass over the points and the result is the size of the grid
+def density_grid(x, y, extent, shape):
+    xmin, xmax, ymin, ymax = extent
+    ny, nx = shape
+    inview = (x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax)
+    col = ((x[inview] - xmin) * (nx / (xmax - xmin))).astype(np.intp)
+    row = ((y[inview] - ymin) * (ny / (ymax - ymin))).astype(np.intp)
+    np.minimum(col, nx - 1, out=col)
+    np.minimum(row, ny - 1, out=row)
+    counts = np.bincount(row * nx + col, minlength=nx * ny)
+    return counts.reshape(ny, nx)
+
+
+# Histogram-equalizes a grid of counts: each non-empty cell is replaced by
+# the fraction of non-empty cells with a count no higher than its own,
+# empty cells are masked out
+def eq_hist(counts):
+    filled = counts > 0
+    nonzero = counts[filled]
+    levels, freq = np.unique(nonzero, return_counts=True)
+    cdf = np.cumsum(freq) / float(max(len(nonzero), 1))
+    out = np.zeros(counts.shape)
+    out[filled] = cdf[np.searchsorted(levels, nonzero)]
+    return np.ma.masked_array(out, mask=~filled)
+
+
+def _density_image(counts, scale):
+    if scale == 'eq_hist':
+        return eq_hist(counts), matplotlib.colors.Normalize(0, 1)
+    image = np.ma.masked_array(counts, mask=counts == 0)
+    vmax = max(counts.max(), 1)
+    if scale == 'log':
+        return image, matplotlib.colors.LogNorm(1, max(vmax, 2))
+    return image, matplotlib.colors.Normalize(0, vmax)
+
+
+def plot_density(x, y, cmap=None, scale='log', color='k', alpha=1.0, pixel=1, **kwargs):
+    # Draws points as a single image of counts per pixel over the current axes,
+    # so drawing cost depends on the size of the axes, not the number of points.
+    # The counts are rebinned for the visible extent whenever the axes are zoomed
+    # or panned. scale is 'log', 'eq_hist' or 'linear'; with no cmap the counts
+    # are shown as color fading in from transparent.
+    # pixel sets the size of a grid cell in screen pixels
+    ax = plt.gca()
+    if cmap is None:
+        cmap = matplotlib.colors.LinearSegmentedColormap.from_list(
+            'density', [matplotlib.colors.to_rgba(color, 0), matplotlib.colors.to_rgba(color, 1)])
+
+    def grid_shape():
+        bbox = ax.get_window_extent()
+        return (max(int(bbox.height / pixel), 1), max(int(bbox.width / pixel), 1))
+
+    xmin, xmax, ymin, ymax = x.min(), x.max(), y.min(), y.max()
+    # pad a degenerate extent so there is something to bin into
+    if xmax == xmin:
+        xmin, xmax = xmin - 0.5, xmax + 0.5
+    if ymax == ymin:
+        ymin, ymax = ymin - 0.5, ymax + 0.5
+    extent = (xmin, xmax, ymin, ymax)
+    image, norm = _density_image(density_grid(x, y, extent, grid_shape()), scale)
+    im = ax.imshow(image, extent=extent, origin='lower', cmap=cmap, norm=norm,
+                   alpha=alpha, interpolation='nearest', **kwargs)
+    state = {'extent': extent, 'busy': False}
+
+    def rebin(ax):
+        if state['busy']:
+            return
+        x0, x1 = sorted(ax.get_xlim())
+        y0, y1 = sorted(ax.get_ylim())
+        if (x0, x1, y0, y1) == state['extent'] or x1 == x0 or y1 == y0:
+            return
+        state['busy'] = True
+        state['extent'] = (x0, x1, y0, y1)
+        image, norm = _density_image(density_grid(x, y, state['extent'], grid_shape()), scale)
+        im.set_data(image)
+        im.set_norm(norm)
+        im.set_extent(state['extent'])
+        state['busy'] = False
+
+    ax.callbacks.connect('xlim_changed', rebin)
+    ax.callbacks.connect('ylim_changed', rebin)
+    return im
+
+
+# The flat buffers of a layer of the given kind ('point', 'line' or
+# 'polygon'). A geoio.CachedLayer hands over the ones it has memory-mapped,
+# for a GeoDataFrame they are pulled out of the geometries
+def layer_buffers(gdf, kind):
+    if hasattr(gdf, 'ragged_buffers'):
+        buffers = gdf.ragged_buffers()
+        if kind == 'point':
+            return buffers[0][:, 0], buffers[0][:, 1]
+        return buffers
+    if kind == 'point':
+        return point_coords(gdf.geometry)
+    if kind == 'line':
+        return line_buffers(gdf.geometry)
+    return polygon_buffers(gdf.geometry)
+
+
+# 'point', 'line' or 'polygon', going by the first geometry of gdf
+def layer_kind(gdf):
+    if hasattr(gdf, 'ragged_buffers'):
+        return gdf.kind
+    layer_type = type(gdf.geometry.iloc[0])
+    if layer_type == shapely.geometry.point.Point:
+        return 'point'
+    elif layer_type == shapely.geometry.linestring.LineString or layer_type == shapely.geometry.multilinestring.MultiLineString:
+        return 'line'
+    return 'polygon'
+
+
+# plt.plot keywords that style markers and have no meaning for an image
+_marker_kwargs = ('marker', 'markersize', 'ms', 'markeredgecolor', 'mec', 'markerfacecolor',
+                  'mfc', 'markeredgewidth', 'mew', 'linestyle', 'ls', 'linewidth', 'lw')
+
+
+def plot_points(gdf, mode='auto', density_threshold=100000, cmap=None, scale='log', **kwargs):
+    # Plots a layer of Points. mode='points' draws a marker for every point,
+    # mode='density' bins them into an image with plot_density and
+    # mode='auto' switches to density above density_threshold points.
+    # In density mode color (or c, or markerfacecolor) is the color the
+    # counts fade into, and other marker keywords are dropped with a warning
+
+    with profiling.span('quickplot.point_coords'):
+        x, y = layer_buffers(gdf, 'point')
+        profiling.count('features processed', len(x))
+        profiling.count('vertices emitted', len(x))
+    if mode == 'auto':
+        mode = 'density' if len(x) > density_threshold else 'points'
+
+    plt.gca().set_aspect('equal')
+    if mode == 'density':
+        used = None
+        if 'color' not in kwargs:
+            for alias in ('c', 'markerfacecolor', 'mfc'):
+                if alias in kwargs:
+                    kwargs['color'] = kwargs[alias]
+                    used = alias
+                    break
+        kwargs.pop('c', None)
+        dropped = [name for name in _marker_kwargs
+                   if kwargs.pop(name, None) is not None and name != used]
+        if dropped:
+            warnings.warn('%d points are drawn as a density image, which ignores %s; '
+                          "pass mode='points' to draw markers"
+                          % (len(x), ', '.join(dropped)), stacklevel=2)
+        with profiling.span('quickplot.plot_density'):
+            return plot_density(x, y, cmap=cmap, scale=scale, **kwargs)
+    with profiling.span('quickplot.autoscale_view'):
+        plt.gca().autoscale_view()
+    with profiling.span('quickplot.plot'):
+        return plt.plot(x, y, 'k.', **kwargs)[0]
+
+
+class Layer(object):
+    # What quickplot returns: the matplotlib artist it drew, plus the
+    # mapping from each drawn part back to its feature in gdf. With these
+    # a layer can be recolored or filtered by changing the color array and
+    # the list of paths handed to the artist, without touching any geometry
+    #
+    #   layer = qp.quickplot(election, column='goppc', cmap='RdBu_r')
+    #   layer.set_column('margin')
+    #   layer.set_filter(election.margin > 0)
+    #
+    # A notebook cell ending in a quickplot call shows the figure and
+    # nothing else, as it did when quickplot returned None
+
+    def __init__(self, gdf, artist, feature_of_part=None, cmap='Set1'):
+        self.gdf = gdf
+        self.artist = artist
+        self.feature_of_part = feature_of_part
+        self.column = None
+        self.cmap = cmap
+        self.norm = None
+        self.scheme = None
+        self.breaks = None
+        self.visible = None
+        self._values = None
+        if feature_of_part is not None:
+            # the full set of drawn parts, which set_filter picks from
+            if isinstance(artist, mpc.LineCollection):
+                self._parts = [path.vertices for path in artist.get_paths()]
+            else:
+                self._parts = list(artist.get_paths())
+            self._visible_parts = np.arange(len(feature_of_part))
+        elif isinstance(artist, mlines.Line2D):
+            self._xy = artist.get_data()
+
+    # IPython calls this instead of printing the repr as a cell's output
+    def _ipython_display_(self):
+        pass
+
+    def __repr__(self):
+        return '<quickplot.Layer of %d features>' % len(self.gdf)
+
+    # Colors the layer by another column of gdf (or by an array with one
+    # value per feature). The norm autoscales to the visible features
+    # unless one is given. With a scheme (see classify.schemes) features
+    # are colored by their class among k, the breaks being kept as
+    # self.breaks; breaks are cached, so going back to a column and scheme
+    # used before does not classify again
+    def set_column(self, column, cmap=None, norm=None, scheme=None, k=5, sample=None):
+        if self.feature_of_part is None:
+            raise ValueError('set_column needs a polygon or line layer')
+        if isinstance(column, str):
+            self.column = column
+            values = self.gdf[column]
+        else:
+            self.column = None
+            values = column
+        self._values = np.asarray(values)
+        self.scheme = scheme
+        self.breaks = None
+        if scheme is not None:
+            self.breaks = classify.breaks(self._values, scheme, k, sample)
+            self._values = classify.classes(self._values, self.breaks)
+            if norm is None:
+                norm = matplotlib.colors.Normalize(0, max(len(self.breaks) - 1, 1))
+        if cmap is not None:
+            self.cmap = cmap
+        self.norm = norm
+        self._update_values()
+        return self
+
+    # Shows only the features where mask is True (one entry per feature),
+    # mask=None shows them all again
+    def set_filter(self, mask):
+        if mask is None:
+            self.visible = None
+        else:
+            self.visible = np.asarray(mask, dtype=bool)
+
+        if self.feature_of_part is not None:
+            if self.visible is None:
+                self._visible_parts = np.arange(len(self.feature_of_part))
+            else:
+                self._visible_parts = np.nonzero(self.visible[self.feature_of_part])[0]
+            parts = [self._parts[i] for i in self._visible_parts]
+            if isinstance(self.artist, mpc.LineCollection):
+                self.artist.set_segments(parts)
+            else:
+                # PatchCollection.set_paths wants patches, the ready made
+                # paths go in the way PathCollection takes them
+                mpc.PathCollection.set_paths(self.artist, parts)
+            self._update_values()
+        elif isinstance(self.artist, mlines.Line2D):
+            x, y = self._xy
+            if self.visible is not None:
+                x, y = np.asarray(x)[self.visible], np.asarray(y)[self.visible]
+            self.artist.set_data(x, y)
+        else:
+            raise ValueError('set_filter is not available for density layers')
+        return self
+
+    # Keeps a polygon layer simplified to the pixel size of its axes,
+    # switching level whenever the axes are zoomed or panned
+    def set_lod(self, lod):
+        self.lod = lod
+        self._level = lod.level(lod.pixel_size(self.artist.axes, lod.bounds))
+        self.artist.axes.callbacks.connect('xlim_changed', self._update_lod)
+        self.artist.axes.callbacks.connect('ylim_changed', self._update_lod)
+        return self
+
+    def _update_lod(self, ax):
+        level = self.lod.level(self.lod.pixel_size(ax))
+        if level == self._level:
+            return
+        self._level = level
+        paths, self.feature_of_part = self.lod.paths(level)
+        self._parts = list(paths)
+        self.set_filter(self.visible)
+
+    def _update_values(self):
+        if self._values is None:
+            return
+        newvals = self._values[self.feature_of_part[self._visible_parts]]
+        _set_values(self.artist, newvals, self.cmap, self.norm)
+
+
+def quickplot(gdf, column=None, cmap='Set1',
+              facecolor=None, edgecolor=None, alpha=1.0, linewidth=0.5, bulk=True,
+              lod=False, scheme=None, k=5, sample=None, **kwargs):
+    # Draws gdf (a GeoDataFrame or a geoio.CachedLayer) on the current axes
+    # and returns it as a Layer
+    # lod=True draws polygons simplified to the screen resolution (see LevelsOfDetail)
+    # scheme='quantiles', 'equal_interval' or 'fisher_jenks' colors column by
+    # k classes, as in GeoDataFrame.plot; sample classifies a random sample
+    # of that many values for very large layers (see classify.breaks)
+
+    with profiling.span('quickplot'):
+        kind = layer_kind(gdf)
+        levels = None
+        # a classified column is colored once the layer is drawn
+        draw_column = column if scheme is None else None
+
+        if kind == 'point':
+            return Layer(gdf, plot_points(gdf, **kwargs))
+
+        elif kind == 'line':
+            artist, feature_of_part = _plot_lines(gdf, draw_column, cmap, facecolor, edgecolor,
+                                                  alpha, linewidth, **kwargs)
+
+        else:
+            if lod and bulk:
+                with profiling.span('quickplot.polygon_buffers'):
+                    levels = LevelsOfDetail(buffers=layer_buffers(gdf, 'polygon'))
+            artist, feature_of_part = _plot_polygons(gdf, draw_column, cmap, facecolor, edgecolor,
+                                                     alpha, linewidth, bulk, levels, **kwargs)
+
+        layer = Layer(gdf, artist, feature_of_part, cmap)
+        if scheme is not None and column is not None:
+            layer.set_column(column, scheme=scheme, k=k, sample=sample)
+        elif column is not None:
+            layer.column = column
+            layer._values = np.asarray(gdf[column])
+        if levels is not None:
+            layer.set_lod(levels)
+        return layer
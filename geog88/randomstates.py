@@ -0,0 +1,1071 @@
+import random # python built in random library
+import math
+import hashlib
+import heapq
+import os
+import json
+import multiprocessing
+import warnings
+import numpy as np
+
+from . import profiling
+from . import quickplot as qp
+from ._lazy import lazy_import
+
+# only needed for state tables, networkx graphs and drawing, so apportion
+# and the ensemble workers never load them
+nx = lazy_import('networkx', globals(), 'nx')
+pd = lazy_import('pandas', globals(), 'pd')
+plt = lazy_import('matplotlib.pyplot', globals(), 'plt')
+mpc = lazy_import('matplotlib.collections', globals(), 'mpc')
+matplotlib = lazy_import('matplotlib', globals(), 'matplotlib', also=['matplotlib.colors'])
+
+# return index of maximum value in list L
+def get_max_idx(L):
+    max_i = 0
+    for i in range(len(L)):
+        if L[i] >= L[max_i]:
+            max_i = i
+    return max_i
+
+# remove item at index i from list L
+def remove_i(L, i):
+    return L[:i] + L[i+1:]
+
+# insert item x at index i in list L
+def insert_i(L, i, x):
+    return L[:i] + [x] + L[i:]
+
+
+## Election-related
+# Apportionment given
+# pops = list of county populations
+# states = list of the state IDs (actual or 'newstate')
+# other parameters are fixed for the US case; as it always has, every state
+# gets 2 electoral votes on top of its seats whatever extras says
+# (apportion_batch honours extras)
+def apportion(pops, states, seats_to_assign=435, initial=1, extras=2, exclude='DC'):
+    pops = list(pops)
+    states = list(states)
+    assigned = [initial] * len(pops)
+    ex = states.index(exclude)
+    assigned = remove_i(assigned, ex)
+    pops = remove_i(pops, ex)
+    remaining = seats_to_assign - sum(assigned)
+    profiling.count('seats assigned', remaining)
+    # keep every state's next priority in a heap, ordered so that ties go
+    # to the later state in the list (as a scan for the last maximum would)
+    queue = [(-p / math.sqrt(a * (a + 1)), -i) for i, (p, a) in enumerate(zip(pops, assigned))]
+    heapq.heapify(queue)
+    while remaining > 0:
+        i = -queue[0][1]
+        assigned[i] += 1
+        a = assigned[i]
+        heapq.heapreplace(queue, (-pops[i] / math.sqrt(a * (a + 1)), -i))
+        remaining -= 1
+    assigned = insert_i(assigned, ex, 1)
+    assigned = [__ + 2 for __ in assigned]
+    return assigned
+
+
+# The same apportionment with NumPy, for many sets of states at once
+# pops = 2D array with one row of state populations per alternative partition
+# states = the state IDs labelling the columns of pops
+# Every state's priority values are computed up front and the seats go to
+# the highest ones, which is what assigning them one at a time amounts to
+# since each state's priorities only fall as it gains seats. Returns a 2D
+# integer array of seats (electoral votes) shaped like pops
+def apportion_batch(pops, states, seats_to_assign=435, initial=1, extras=2, exclude='DC'):
+    pops = np.atleast_2d(np.asarray(pops, dtype=float))
+    states = list(states)
+    ex = states.index(exclude)
+    others = np.array([i for i in range(len(states)) if i != ex], dtype=np.intp)
+    p = pops[:, others]
+    n_draws, n_states = p.shape
+    remaining = seats_to_assign - initial * n_states
+    assigned = np.full(p.shape, initial, dtype=np.int64)
+
+    if remaining > 0:
+        profiling.count('seats assigned', remaining * n_draws)
+        # no state can take more than max_extra further seats: the
+        # remaining-th highest priority is at least total / (remaining + 2 * n_states)
+        total = p.sum(axis=1, keepdims=True)
+        max_extra = int(np.floor(p * (remaining + 2 * n_states) / total).max()) + 1
+        max_extra = min(max_extra, remaining)
+        a = initial + np.arange(max_extra, dtype=float)
+        # priorities[d, s, k] is the priority of state s for its (initial + k + 1)th seat,
+        # states taken in reverse so a stable sort hands ties to the later state
+        priorities = p[:, ::-1, None] / np.sqrt(a * (a + 1))
+        priorities = priorities.reshape(n_draws, -1)
+        order = np.argsort(-priorities, axis=1, kind='mergesort')[:, :remaining]
+        winners = n_states - 1 - order // max_extra
+        rows = np.repeat(np.arange(n_draws), remaining)
+        counts = np.bincount(rows * n_states + winners.ravel(),
+                             minlength=n_draws * n_states)
+        assigned += counts.reshape(n_draws, n_states)
+
+    result = np.empty(pops.shape, dtype=np.int64)
+    result[:, others] = assigned + extras
+    result[:, ex] = 1 + extras
+    return result
+
+
+# apportion for a single set of states, done with apportion_batch
+def apportion_numpy(pops, states, seats_to_assign=435, initial=1, extras=2, exclude='DC'):
+    return list(apportion_batch([list(pops)], states, seats_to_assign,
+                                initial, extras, exclude)[0])
+
+
+# Determine election outcome
+def run_election(df, statevar='state', pop='population', ev='ev'):
+    # states = make_states(df, statevar)
+    df[ev] = apportion(df[pop], df[statevar])
+    return {'gop': sum(df.ev[df.win == 'R']), 
+            'dem': sum(df.ev[df.win == 'D'])}
+    
+
+# Sums county attributes by state for one or many assignments of counties
+# to states, one bincount per attribute (the same as multiplying by the
+# sparse county-to-state incidence matrix)
+# codes = state index of every county (-1 leaves a county out), 1D for one
+#         assignment or 2D with one row per assignment
+# values = (counties, attributes) array
+# Returns (states, attributes) totals, or (assignments, states, attributes)
+def state_totals(codes, values, n_states):
+    codes = np.asarray(codes)
+    values = np.asarray(values, dtype=float).reshape(len(values), -1)
+    single = codes.ndim == 1
+    codes = np.atleast_2d(codes)
+    n_rows = codes.shape[0]
+    with profiling.span('randomstates.state_totals'):
+        rows, counties = np.nonzero(codes >= 0)
+        bins = rows * n_states + codes[rows, counties]
+        totals = np.empty((n_rows * n_states, values.shape[1]))
+        for k in range(values.shape[1]):
+            totals[:, k] = np.bincount(bins, weights=values[counties, k],
+                                       minlength=n_rows * n_states)
+        profiling.count('counties totalled', len(counties))
+    totals = totals.reshape(n_rows, n_states, values.shape[1])
+    return totals[0] if single else totals
+
+
+# Electoral votes and winners from state totals, each argument holding one
+# row per assignment of counties to states. R takes a state with more gop
+# than dem votes (as in make_states). Returns the electoral votes and a
+# boolean array that is True where R wins
+def tally_elections(pop, dem, gop, states, exclude='DC'):
+    with profiling.span('randomstates.apportion'):
+        ev = apportion_batch(pop, states, exclude=exclude)
+    return ev, np.atleast_2d(gop) > np.atleast_2d(dem)
+
+
+class StateAggregator(object):
+    # Totals county attributes into states without dissolving any geometry.
+    # The attribute matrix is taken from counties once; after that each
+    # assignment of counties to states is a bincount per attribute, and
+    # state polygons are only unioned by dissolve, when a map is wanted
+    #
+    #   agg = StateAggregator(election)
+    #   states = agg.states(rs.random_states(election, GN=G), statevar='newstate')
+    #   agg.elections(codes, agg.labels)  # many assignments at once
+
+    def __init__(self, counties, dem='dem', gop='gop', votes='votes', pop='population'):
+        self.counties = counties
+        self.variables = [dem, gop, votes, pop]
+        self.values = np.column_stack([np.asarray(counties[v], dtype=float)
+                                       for v in self.variables])
+
+    # state codes and state labels for a list of county labels
+    def codes(self, assignment):
+        labels, codes = np.unique(np.asarray(assignment, dtype=object).astype(str),
+                                  return_inverse=True)
+        return codes, list(labels)
+
+    # Totals, vote shares, margin, winner and electoral votes of every state
+    # for one assignment (a state label per county), in the layout make_states
+    # and run_election produce, but with no geometry column
+    def states(self, assignment, statevar='state', exclude='DC'):
+        codes, labels = self.codes(assignment)
+        totals = state_totals(codes, self.values, len(labels))
+        dem, gop, votes, pop = self.variables
+        states = pd.DataFrame(totals, columns=self.variables)
+        states.insert(0, statevar, labels)
+        states['dempc'] = states[dem] / states[votes]
+        states['goppc'] = states[gop] / states[votes]
+        states['margin'] = states.goppc - states.dempc
+        states['win'] = np.where(states[gop] > states[dem], 'R', 'D')
+        with profiling.span('randomstates.apportion'):
+            states['ev'] = apportion_batch(totals[:, 3], labels, exclude=exclude)[0]
+        return states
+
+    # Electoral-vote results for many assignments at once
+    # codes = 2D array of state codes (indexes into labels), one row per assignment
+    # Returns the state totals and, per assignment, each state's electoral votes,
+    # whether R wins it, and the gop and dem electoral vote totals
+    def elections(self, codes, labels, exclude='DC'):
+        totals = state_totals(np.atleast_2d(codes), self.values, len(labels))
+        ev, gop_wins = tally_elections(totals[:, :, 3], totals[:, :, 0], totals[:, :, 1],
+                                       labels, exclude)
+        return {'totals': totals, 'ev': ev, 'gop_wins': gop_wins,
+                'gop': (ev * gop_wins).sum(axis=1), 'dem': (ev * ~gop_wins).sum(axis=1)}
+
+    # The states for one assignment with their geometry, unioned from the
+    # counties: only needed for mapping
+    def dissolve(self, assignment, statevar='state', exclude='DC'):
+        states = self.states(assignment, statevar, exclude)
+        with profiling.span('randomstates.dissolve'):
+            shapes = self.counties[[self.counties.geometry.name]].assign(
+                **{statevar: np.asarray(assignment, dtype=object).astype(str)})
+            shapes = shapes.dissolve(by=statevar, as_index=False)
+            profiling.count('features processed', len(self.counties))
+            return shapes.merge(states, on=statevar)
+
+
+# Uniform floats in [0, 1), and integers in [0, high) for each entry of
+# high, from either a NumPy Generator or a RandomState (or np.random
+# itself), the only kind before NumPy 1.17
+def _uniform(rng, size=None):
+    if hasattr(rng, 'integers'):
+        return rng.random(size)
+    return rng.random_sample(size)
+
+
+def _below(rng, high):
+    if hasattr(rng, 'integers'):
+        return rng.integers(0, high)
+    high = np.asarray(high)
+    return (rng.random_sample(high.shape) * high).astype(np.int64)
+
+
+class SeedIndex(object):
+    # The counties of every state stored state by state, so seed counties
+    # are drawn in constant time per state instead of by scanning the
+    # graph: uniformly, weighted by population (Walker's alias method) or
+    # the most populous. state and pop hold one entry per node
+    #
+    #   index = seed_index(G)
+    #   orders, seeds = index.draw(np.random.RandomState(0), 1000)
+
+    def __init__(self, state, pop):
+        state = np.asarray(state)
+        pop = np.asarray(pop, dtype=float)
+        self.labels = sorted(set(state))
+        self.code = {s: i for i, s in enumerate(self.labels)}
+        home = np.array([self.code[s] for s in state], dtype=np.int64)
+        # counties of each state in node order, as the graph lists them
+        self.nodes = np.argsort(home, kind='mergesort')
+        self.counts = np.bincount(home, minlength=len(self.labels))
+        self.starts = np.concatenate([[0], np.cumsum(self.counts)[:-1]])
+        # most populous county of each state, the last one listed if tied
+        # (as sorting (pop, node) pairs and taking the last would)
+        order = np.lexsort((np.arange(len(home)), pop, home))
+        self.most_populous = order[np.cumsum(self.counts) - 1]
+
+        # alias tables, by position in self.nodes
+        self.prob = np.ones(len(home))
+        self.alias = np.arange(len(home))
+        for start, count in zip(self.starts, self.counts):
+            w = pop[self.nodes[start:start + count]]
+            if w.sum() <= 0:
+                continue
+            w = w * count / w.sum()
+            small = [i for i in range(count) if w[i] < 1]
+            large = [i for i in range(count) if w[i] >= 1]
+            while small and large:
+                i, j = small.pop(), large[-1]
+                self.prob[start + i] = w[i]
+                self.alias[start + i] = start + j
+                w[j] -= 1 - w[i]
+                if w[j] < 1:
+                    small.append(large.pop())
+            for i in small + large:
+                self.prob[start + i] = 1
+
+    def state_nodes(self, label):
+        c = self.code[label]
+        return self.nodes[self.starts[c]:self.starts[c] + self.counts[c]]
+
+    # One seed node for each state code in codes (any shape), drawn with rng,
+    # a NumPy Generator or RandomState. method is 'default' (uniform), 'weighted' (by
+    # population) or 'pop' (the most populous county)
+    def sample(self, rng, codes, method='default'):
+        codes = np.asarray(codes)
+        if method == 'pop':
+            return self.most_populous[codes]
+        picks = self.starts[codes] + _below(rng, self.counts[codes])
+        if method == 'weighted':
+            stay = _uniform(rng, codes.shape) < self.prob[picks]
+            picks = np.where(stay, picks, self.alias[picks])
+        return self.nodes[picks]
+
+    # Random state orders and seeds for n_draws draws at once: two
+    # (n_draws, states) arrays, state codes in drawing order and their seeds
+    def draw(self, rng, n_draws, method='default'):
+        orders = np.argsort(_uniform(rng, (n_draws, len(self.labels))), axis=1)
+        return orders, self.sample(rng, orders, method)
+
+
+# The SeedIndex of a graph, built on first use and then kept with it
+def seed_index(graph):
+    if isinstance(graph, Adjacency):
+        if graph.seeds is None:
+            graph.seeds = SeedIndex(graph.state, graph.pop)
+        return graph.seeds
+    if 'seeds' not in graph.graph:
+        nodes = sorted(graph.nodes(data=True), key=lambda n: n[0])
+        graph.graph['seeds'] = SeedIndex([n[1]['state'] for n in nodes],
+                                         [n[1]['pop'] for n in nodes])
+    return graph.graph['seeds']
+
+
+# returns a list of random county ids
+# method is 'default' (any county of the state), 'weighted' (counties
+# drawn in proportion to population) or 'pop' (the most populous county)
+def get_seeds(e, graph, method='default'):
+    state_ids = list(set(e.state))
+    random.shuffle(state_ids)
+    index = seed_index(graph)
+    seeds = []
+    if method=='default':
+        for s in state_ids:
+            seeds.append(int(random.choice(index.state_nodes(s))))
+        return seeds, state_ids
+    elif method=='weighted':
+        for s in state_ids:
+            i = index.starts[index.code[s]] + random.randrange(index.counts[index.code[s]])
+            if random.random() >= index.prob[i]:
+                i = index.alias[i]
+            seeds.append(int(index.nodes[i]))
+        return seeds, state_ids
+    elif method=='pop':
+        for s in state_ids:
+            seeds.append(int(index.most_populous[index.code[s]]))
+        return seeds, state_ids
+
+
+# Pairs of features that share at least one boundary segment (rook
+# contiguity), from flat polygon buffers (see quickplot.polygon_buffers).
+# Every segment is keyed on its two end points, put in a fixed order, and
+# segments with the same key in different features make those features
+# neighbours. Returns an (E, 2) array of pairs i < j
+def rook_pairs(coords, ring_offsets, part_offsets, geom_offsets):
+    ring_of_vertex = np.repeat(np.arange(len(ring_offsets) - 1), np.diff(ring_offsets))
+    part_of_ring = np.repeat(np.arange(len(part_offsets) - 1), np.diff(part_offsets))
+    geom_of_part = np.repeat(np.arange(len(geom_offsets) - 1), np.diff(geom_offsets))
+    feature = geom_of_part[part_of_ring[ring_of_vertex]]
+
+    # a segment from every vertex to the next one in the same ring
+    start = np.nonzero(ring_of_vertex[1:] == ring_of_vertex[:-1])[0]
+    a = coords[start, :2]
+    b = coords[start + 1, :2]
+    swap = (a[:, 0] > b[:, 0]) | ((a[:, 0] == b[:, 0]) & (a[:, 1] > b[:, 1]))
+    key = np.where(swap[:, None], np.hstack([b, a]), np.hstack([a, b]))
+    real = (key[:, :2] != key[:, 2:]).any(axis=1)
+    key, f = key[real], feature[start][real]
+
+    order = np.lexsort((f, key[:, 3], key[:, 2], key[:, 1], key[:, 0]))
+    key, f = key[order], f[order]
+    new = np.ones(len(key), dtype=bool)
+    new[1:] = (key[1:] != key[:-1]).any(axis=1)
+    group = np.cumsum(new)
+    # pair every segment with each earlier one under the same key
+    pairs = [np.zeros((0, 2), dtype=np.int64)]
+    k = 1
+    while k < len(group):
+        same = group[k:] == group[:-k]
+        if not same.any():
+            break
+        pairs.append(np.column_stack([f[:-k][same], f[k:][same]]))
+        k += 1
+    pairs = np.concatenate(pairs)
+    pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+    pairs.sort(axis=1)
+    if len(pairs) == 0:
+        return pairs
+    return np.unique(pairs, axis=0)
+
+
+# CSR arrays (indptr, indices) for n nodes from an (E, 2) array of edges
+def edges_to_csr(n, edges):
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    src = np.concatenate([edges[:, 0], edges[:, 1]])
+    dst = np.concatenate([edges[:, 1], edges[:, 0]])
+    order = np.lexsort((dst, src))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(src, minlength=n))
+    return indptr, dst[order]
+
+
+class Adjacency(object):
+    # County adjacency in compressed sparse row form: the neighbours of
+    # node i are indices[indptr[i]:indptr[i + 1]]. Node attributes are
+    # arrays (state, pop) and islands lists the nodes that had no
+    # neighbours at all, like the islands of a pysal weights object.
+    # make_graph returns one of these; it stands in for the old
+    # (graph, neighbors) pair wherever GN is asked for, and unpacks as one
+    #
+    #   G, neighbors = rs.make_graph(election)   # both the Adjacency
+
+    def __init__(self, indptr, indices, islands, state, pop):
+        self.indptr = indptr
+        self.indices = indices
+        self.islands = islands
+        self.state = state
+        self.pop = pop
+        self.seeds = None
+
+    def __iter__(self):
+        return iter((self, self))
+
+    def number_of_nodes(self):
+        return len(self.indptr) - 1
+
+    def number_of_edges(self):
+        return len(self.indices) // 2
+
+    def neighbors(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    # (E, 2) array of edges, each once with i < j
+    def edges(self):
+        src = np.repeat(np.arange(self.number_of_nodes()), np.diff(self.indptr))
+        once = src < self.indices
+        return np.column_stack([src[once], self.indices[once]])
+
+    def nodes(self, data=False):
+        if not data:
+            return range(self.number_of_nodes())
+        return [(i, {'state': s, 'pop': p}) for i, (s, p) in enumerate(zip(self.state, self.pop))]
+
+    def to_networkx(self):
+        G = nx.Graph()
+        G.add_nodes_from(self.nodes(data=True))
+        G.add_edges_from(self.edges().tolist())
+        return G
+
+
+# graph and neighbors from either an Adjacency or a (graph, neighbors) pair
+def unpack_graph(GN):
+    if isinstance(GN, Adjacency):
+        return GN, GN
+    return GN
+
+
+# Builds the rook adjacency of the counties in e_map from their geometry in
+# memory, by matching shared boundary segments. The counties of exclude
+# (DC) get no neighbours, so they stay a state of their own. With cache_dir
+# the adjacency is saved there, keyed on a hash of the geometry, and
+# later calls read it back memory-mapped. src, the shapefile pysal used to
+# read the adjacency from, is no longer needed and is ignored
+def make_graph(e_map, src=None, *, cache_dir=None, exclude='DC'):
+    if src is not None:
+        warnings.warn('make_graph builds the adjacency from e_map; src is ignored',
+                      DeprecationWarning, stacklevel=2)
+    state = np.asarray(e_map.state)
+    pop = np.asarray(e_map.population)
+    n = len(state)
+    excluded = state == exclude
+    with profiling.span('randomstates.polygon_buffers'):
+        buffers = qp.polygon_buffers(e_map.geometry)
+        profiling.count('features processed', n)
+        profiling.count('vertices emitted', len(buffers[0]))
+
+    path = None
+    if cache_dir is not None:
+        digest = hashlib.sha1()
+        for a in buffers + (excluded,):
+            digest.update(np.ascontiguousarray(a).tobytes())
+        path = os.path.join(cache_dir, 'rook-%s.npy' % digest.hexdigest())
+        if os.path.exists(path):
+            profiling.count('graph cache hits')
+            # [n, number of islands, indptr, islands, indices] in one array
+            packed = np.load(path, mmap_mode='r')
+            n_islands = int(packed[1])
+            indptr = packed[2:n + 3]
+            islands = packed[n + 3:n + 3 + n_islands]
+            indices = packed[n + 3 + n_islands:]
+            return Adjacency(indptr, indices, islands, state, pop)
+
+    with profiling.span('randomstates.rook_pairs'):
+        pairs = rook_pairs(*buffers)
+    with profiling.span('randomstates.edges_to_csr'):
+        indptr, indices = edges_to_csr(n, pairs)
+        islands = np.nonzero(np.diff(indptr) == 0)[0]
+        # now make DC into an island by removing all edges including it
+        pairs = pairs[~(excluded[pairs[:, 0]] | excluded[pairs[:, 1]])]
+        indptr, indices = edges_to_csr(n, pairs)
+        profiling.count('nodes', n)
+        profiling.count('edges', len(pairs))
+
+    if path is not None:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        packed = np.concatenate([[n, len(islands)], indptr, islands, indices]).astype(np.int64)
+        tmp = path + '.tmp.npy'
+        np.save(tmp, packed)
+        os.replace(tmp, path)
+    return Adjacency(indptr, indices, islands, state, pop)
+
+
+# Compressed sparse row (CSR) form of the adjacency in graph, whose nodes
+# are numbered 0 to n-1: the neighbours of node i are
+# indices[indptr[i]:indptr[i + 1]]. An Adjacency already is one; for a
+# networkx graph it is kept in the graph's attribute dict and rebuilt if
+# the number of edges changes
+def graph_csr(graph):
+    if isinstance(graph, Adjacency):
+        return graph.indptr, graph.indices
+    cached = graph.graph.get('csr')
+    if cached is not None and cached[0] == graph.number_of_edges():
+        return cached[1], cached[2]
+    indptr, indices = edges_to_csr(graph.number_of_nodes(), list(graph.edges()))
+    graph.graph['csr'] = (graph.number_of_edges(), indptr, indices)
+    return indptr, indices
+
+
+# Assigns every node to its nearest seed by graph distance, with a single
+# breadth-first search grown from all the seeds at once, one level at a time.
+# Returns for each node the position in seeds of its nearest seed, or -1
+# if no seed reaches it. Ties go to the earliest seed in the list, or with
+# random_ties=True to a random one of the tied neighbours in the frontier
+# (rng is a NumPy Generator/RandomState, the global one by default)
+def nearest_seeds(indptr, indices, seeds, random_ties=False, rng=None):
+    owner = np.full(len(indptr) - 1, -1, dtype=np.int64)
+    frontier = np.asarray(seeds, dtype=np.int64)
+    owner[frontier] = np.arange(len(frontier))
+    if rng is None:
+        rng = np.random
+    with profiling.span('randomstates.bfs'):
+        nodes_visited, edges_visited = len(frontier), 0
+        while len(frontier) > 0:
+            # every edge leaving the frontier
+            starts = indptr[frontier]
+            degrees = indptr[frontier + 1] - starts
+            n_edges = int(degrees.sum())
+            edges_visited += n_edges
+            src = np.repeat(frontier, degrees)
+            offsets = np.arange(n_edges) + np.repeat(starts - np.cumsum(degrees) + degrees, degrees)
+            dst = indices[offsets]
+            unseen = owner[dst] < 0
+            src, dst = src[unseen], dst[unseen]
+            if len(dst) == 0:
+                break
+            candidate = owner[src]
+            # group the edges by the node they reach, preferred candidate first
+            if random_ties:
+                order = np.lexsort((_uniform(rng, len(dst)), dst))
+            else:
+                order = np.lexsort((candidate, dst))
+            dst, candidate = dst[order], candidate[order]
+            first = np.ones(len(dst), dtype=bool)
+            first[1:] = dst[1:] != dst[:-1]
+            frontier = dst[first]
+            owner[frontier] = candidate[first]
+            nodes_visited += len(frontier)
+        profiling.count('nodes visited', nodes_visited)
+        profiling.count('edges visited', edges_visited)
+    return owner
+
+
+# The neighborhood relations come from make_graph
+# (an older networkx graph and pysal neighbors pair works too)
+def random_states(e_map, GN=None, method='default', random_ties=False):
+    with profiling.span('randomstates.random_states'):
+        if GN is None:
+            GN = make_graph(e_map)
+        graph, neighbors = unpack_graph(GN)
+
+        with profiling.span('randomstates.seeds'):
+            seed_counties, state_ids = get_seeds(e_map, graph, method=method)
+
+        # grow every state out from its seed county at once, each county
+        # going to the nearest seed (the first one drawn if tied)
+        indptr, indices = graph_csr(graph)
+        owner = nearest_seeds(indptr, indices, seed_counties, random_ties=random_ties)
+        with profiling.span('randomstates.labels'):
+            # counties no seed reaches are 'XX', found at owner -1
+            labels = np.array(list(state_ids) + ['XX'], dtype=object)
+            nearest_states = labels[owner]
+            # islands keep the state they are in
+            for x in neighbors.islands:
+                nearest_states[x] = e_map.loc[x].state
+            return list(nearest_states)
+
+
+# Draws the counties, their centroids and the adjacency graph as one
+# LineCollection of centroid-to-centroid segments, built straight from
+# coordinate arrays. Edges can be colored by whether they cross between
+# states (states = a column name or one label per county) or by
+# edge_values, one value per edge in the order of the graph's edges
+def draw_graph(e_map, GN, states=None, edge_values=None, cmap='coolwarm',
+               color='#ff0000', cross_color='#0000ff', linewidth=0.35):
+    G, neighbors = unpack_graph(GN)
+    x, y = qp.point_coords(e_map.geometry.centroid)
+    if isinstance(G, Adjacency):
+        edges = G.edges()
+    else:
+        edges = np.array(list(G.edges()), dtype=np.int64).reshape(-1, 2)
+    # (E, 2, 2): for each edge, the centroids at both ends
+    segments = np.stack([x[edges], y[edges]], axis=-1)
+
+    links = mpc.LineCollection(segments, linewidth=linewidth, colors=color)
+    if edge_values is not None:
+        links.set_array(np.asarray(edge_values))
+        links.set_cmap(cmap)
+    elif states is not None:
+        if isinstance(states, str):
+            states = e_map[states]
+        states = np.asarray(states)
+        cross = states[edges[:, 0]] != states[edges[:, 1]]
+        links.set_color(matplotlib.colors.to_rgba_array([color, cross_color])[cross.astype(int)])
+
+    fig = plt.figure(figsize=(12,9))
+    qp.quickplot(e_map, facecolor='w', edgecolor='k', linewidth=0.2)
+    plt.gca().add_collection(links, autolim=True)
+    plt.plot(x, y, '.', markersize=1, color='r')
+    return links
+
+
+## Ensembles
+# Everything a simulated election needs, as plain arrays, so a draw
+# never touches geometry or networkx and worker processes only get
+# what they need once
+def ensemble_data(e_map, GN, statevar='state', pop='population', dem='dem', gop='gop'):
+    graph, neighbors = unpack_graph(GN)
+    indptr, indices = graph_csr(graph)
+    population = np.asarray(e_map[pop], dtype=float)
+    seeds = SeedIndex(np.asarray(e_map[statevar]), population)
+    home = np.array([seeds.code[s] for s in e_map[statevar]], dtype=np.int64)
+    return {'indptr': indptr, 'indices': indices, 'states': seeds.labels,
+            'home': home, 'seeds': seeds,
+            'islands': np.asarray(list(neighbors.islands), dtype=np.int64),
+            'values': np.column_stack([population,
+                                       np.asarray(e_map[dem], dtype=float),
+                                       np.asarray(e_map[gop], dtype=float)])}
+
+
+# The random generator for one draw, derived from the master seed and the
+# draw id alone, so a draw gives the same result whichever process runs it.
+# NumPy before 1.17 has no SeedSequence: there the draw gets a RandomState
+# seeded with a hash of (seed, draw), so results are repeatable on one
+# NumPy but differ between the two kinds of generator
+def draw_rng(seed, draw):
+    if hasattr(np.random, 'SeedSequence'):
+        return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(draw,)))
+    digest = hashlib.sha1(('%d/%d' % (seed, draw)).encode()).digest()
+    return np.random.RandomState(np.frombuffer(digest, dtype=np.uint32))
+
+
+# One random partition: returns the state code of every county (-1 where
+# no seed reaches), drawn like random_states but with a NumPy generator
+def simulate_states(data, rng, method='default'):
+    n_states = len(data['states'])
+    with profiling.span('randomstates.seeds'):
+        state_order = rng.permutation(n_states)
+        seeds = data['seeds'].sample(rng, state_order, method)
+    owner = nearest_seeds(data['indptr'], data['indices'], seeds)
+    assignment = np.where(owner >= 0, state_order[owner], -1)
+    assignment[data['islands']] = data['home'][data['islands']]
+    return assignment
+
+
+# Runs the elections for a block of draws: returns the draw ids, the gop and
+# dem electoral votes and the state code of every county in every draw
+def simulate_elections(data, draws, seed, method='default'):
+    assignment = np.empty((len(draws), len(data['home'])), dtype=np.int16)
+    for row, draw in enumerate(draws):
+        assignment[row] = simulate_states(data, draw_rng(seed, draw), method)
+    profiling.count('draws', len(draws))
+    totals = state_totals(assignment, data['values'], len(data['states']))
+    ev, gop_wins = tally_elections(totals[:, :, 0], totals[:, :, 1], totals[:, :, 2],
+                                   data['states'])
+    return {'draw': np.asarray(draws, dtype=np.int64),
+            'gop': (ev * gop_wins).sum(axis=1).astype(np.int16),
+            'dem': (ev * ~gop_wins).sum(axis=1).astype(np.int16),
+            'assignment': assignment}
+
+
+_worker_data = None
+_worker_profile = False
+
+
+# profile=True records profiling spans in a worker process and sends them
+# back with each chunk, to be merged into the profile of the parent
+def _init_worker(data, profile=False):
+    global _worker_data, _worker_profile
+    _worker_data = data
+    _worker_profile = profile
+    if profile:
+        profiling.start_worker()
+
+
+def _run_chunk(task):
+    chunk, draws, seed, method = task
+    with profiling.span('randomstates.simulate_elections'):
+        result = simulate_elections(_worker_data, draws, seed, method)
+    return chunk, result, profiling.collect() if _worker_profile else []
+
+
+def _chunk_path(checkpoint, chunk):
+    return os.path.join(checkpoint, 'chunk_%06d.npz' % chunk)
+
+
+# A hash of everything in ensemble data a draw depends on, so a checkpoint
+# is only resumed for the map and graph it was written for
+def _data_fingerprint(data):
+    digest = hashlib.sha1()
+    for key in ('indptr', 'indices', 'home', 'islands', 'values'):
+        digest.update(np.ascontiguousarray(data[key]).tobytes())
+    digest.update(json.dumps(list(data['states'])).encode())
+    return digest.hexdigest()
+
+
+# Runs n_draws random-state elections over a pool of processes and yields
+# the results a block of chunk_size draws at a time, as they finish (so not
+# necessarily in order). Every draw has its own random stream derived from
+# seed, so results are the same whatever the number of processes.
+# With a checkpoint directory each finished block is saved there, and blocks
+# already saved by an earlier, interrupted run are read back, not rerun.
+# A saved block is only reused if it holds exactly the draws asked for (a
+# short last block of a smaller ensemble is run again), and a checkpoint
+# written for other inputs or settings raises ValueError
+def iter_ensemble(e_map, GN, n_draws, seed=0, processes=None, chunk_size=100,
+                  checkpoint=None, method='default'):
+    with profiling.span('randomstates.ensemble_data'):
+        data = ensemble_data(e_map, GN)
+    if checkpoint is not None:
+        settings = {'seed': seed, 'chunk_size': chunk_size, 'method': method,
+                    'inputs': _data_fingerprint(data),
+                    # draws of the two kinds of generator do not mix
+                    'generator': type(draw_rng(seed, 0)).__name__}
+        manifest = os.path.join(checkpoint, 'ensemble.json')
+        if os.path.exists(manifest):
+            with open(manifest) as f:
+                if json.load(f) != settings:
+                    raise ValueError('checkpoint %s was written with different settings or inputs' % checkpoint)
+        else:
+            if not os.path.isdir(checkpoint):
+                os.makedirs(checkpoint)
+            with open(manifest, 'w') as f:
+                json.dump(settings, f)
+
+    todo = []
+    for chunk in range(int(math.ceil(n_draws / float(chunk_size)))):
+        draws = list(range(chunk * chunk_size, min((chunk + 1) * chunk_size, n_draws)))
+        if checkpoint is not None and os.path.exists(_chunk_path(checkpoint, chunk)):
+            with np.load(_chunk_path(checkpoint, chunk)) as saved:
+                saved = dict(saved)
+            if np.array_equal(saved['draw'], draws):
+                yield saved
+                continue
+        todo.append((chunk, draws, seed, method))
+
+    if processes == 1:
+        _init_worker(data)
+        results = map(_run_chunk, todo)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(processes, initializer=_init_worker,
+                                    initargs=(data, profiling.enabled))
+        results = pool.imap_unordered(_run_chunk, todo)
+    try:
+        for chunk, result, events in results:
+            profiling.merge(events)
+            if checkpoint is not None:
+                # write then rename, so an interrupted run never leaves half a chunk
+                tmp = _chunk_path(checkpoint, chunk) + '.tmp.npz'
+                np.savez(tmp, **result)
+                os.replace(tmp, _chunk_path(checkpoint, chunk))
+            yield result
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+
+# Runs a whole ensemble (see iter_ensemble) and returns the results as one
+# table of arrays sorted by draw id: 'draw', 'gop' and 'dem' electoral
+# votes, and 'assignment', the state of every county in every draw as an
+# index into 'states'
+def run_ensemble(e_map, GN, n_draws, seed=0, processes=None, chunk_size=100,
+                 checkpoint=None, method='default'):
+    with profiling.span('randomstates.run_ensemble'):
+        blocks = list(iter_ensemble(e_map, GN, n_draws, seed, processes, chunk_size,
+                                    checkpoint, method))
+    table = {k: np.concatenate([b[k] for b in blocks]) for k in ('draw', 'gop', 'dem', 'assignment')}
+    order = np.argsort(table['draw'])
+    table = {k: v[order] for k, v in table.items()}
+    table['states'] = sorted(set(e_map.state))
+    return table
+
+
+## Markov chain
+class FlipChain(object):
+    # A Markov chain over partitions of the counties into states: each step
+    # moves one county on a state boundary into the state across it, so
+    # consecutive partitions differ by one county instead of being redrawn.
+    # Everything an election needs is kept up to date as counties move:
+    # each state's population, dem and gop totals, the set of cut edges
+    # between states, the Huntington-Hill apportionment and the electoral
+    # vote tally. A step costs the neighbourhood of the county moved and
+    # the states it touched, not a pass over the map
+    #
+    #   chain = rs.FlipChain(election, G, seed=0)
+    #   table = chain.run(100000, thin=100)     # gop and dem EV every 100 steps
+    #   agg.states(chain.labels())              # the partition as it stands
+    #
+    # A county only moves if the part of its state it leaves stays
+    # connected around it. With reversible=True moves are accepted with
+    # the Metropolis-Hastings ratio, so the chain samples contiguous
+    # partitions uniformly; pop_tolerance keeps every state within that
+    # fraction of its starting population. assignment is the starting
+    # partition, a state label or state code per county (the real states
+    # by default). The counties of exclude (DC) have no edges, so DC
+    # stays as it is
+
+    initial = 1
+    extras = 2
+
+    def __init__(self, e_map, GN, assignment=None, seed=0, reversible=True,
+                 pop_tolerance=None, exclude='DC'):
+        data = ensemble_data(e_map, GN)
+        self.states = data['states']
+        self.values = data['values']
+        self.reversible = reversible
+        self.rng = random.Random(seed)
+        n_states = len(self.states)
+
+        if assignment is None:
+            codes = data['home'].copy()
+        else:
+            assignment = np.asarray(assignment)
+            if assignment.dtype.kind in 'iu':
+                codes = assignment.astype(np.int64)
+            else:
+                codes = np.array([data['seeds'].code[s] for s in assignment], dtype=np.int64)
+        if (codes < 0).any():
+            raise ValueError('every county needs a state to start from')
+        self.assignment = codes.tolist()
+        self.counts = np.bincount(codes, minlength=n_states).tolist()
+
+        # every edge once, i < j, and for each county its (neighbour, edge) pairs
+        indptr, indices = data['indptr'], data['indices']
+        n = len(indptr) - 1
+        src = np.repeat(np.arange(n), np.diff(indptr))
+        once = src < indices
+        edges = np.column_stack([src[once], indices[once]])
+        keys = edges[:, 0] * n + edges[:, 1]
+        edge_of_slot = np.searchsorted(keys, np.minimum(src, indices) * n + np.maximum(src, indices))
+        self.edges = edges.tolist()
+        self.incident = [list(zip(indices[indptr[i]:indptr[i + 1]].tolist(),
+                                  edge_of_slot[indptr[i]:indptr[i + 1]].tolist()))
+                         for i in range(n)]
+
+        # the cut edges, as a list to draw from and the position of each in it
+        self.cut = np.nonzero(codes[edges[:, 0]] != codes[edges[:, 1]])[0].tolist()
+        self.cut_position = [-1] * len(edges)
+        for p, e in enumerate(self.cut):
+            self.cut_position[e] = p
+
+        self.totals = state_totals(codes, self.values, n_states)
+        if pop_tolerance is None:
+            self.pop_bounds = None
+        else:
+            self.pop_bounds = (self.totals[:, 0] * (1 - pop_tolerance),
+                               self.totals[:, 0] * (1 + pop_tolerance))
+
+        # seats above the initial ones; a state's next seat and its last
+        # seat have priorities pop / sqrt(k (k + 1)) and pop / sqrt((k - 1) k),
+        # and the apportionment is right while every next seat ranks below
+        # every last seat, ties going to the later state as in apportion
+        self.exclude = self.states.index(exclude)
+        self.seats = apportion_batch(self.totals[:, 0], self.states, initial=self.initial,
+                                     extras=0, exclude=exclude)[0]
+        self.next_priority = np.full(n_states, -np.inf)
+        self.last_priority = np.full(n_states, np.inf)
+        for s in range(n_states):
+            self._priorities(s)
+        ev = self.seats + self.extras
+        self.total_ev = int(ev.sum())
+        self.gop_by_state = (ev * (self.totals[:, 2] > self.totals[:, 1])).tolist()
+        self.gop_ev = int(sum(self.gop_by_state))
+        self.steps = 0
+        self.accepted = 0
+
+    def _priorities(self, s):
+        if s == self.exclude:
+            return
+        pop = self.totals[s, 0]
+        k = int(self.seats[s])
+        self.next_priority[s] = pop / math.sqrt(k * (k + 1))
+        self.last_priority[s] = pop / math.sqrt((k - 1) * k) if k > self.initial else np.inf
+
+    # Moves seats from the lowest ranked last seat to the highest ranked
+    # next seat until none outranks another, after the populations of
+    # states a and b changed. Returns the states whose seats changed
+    def _reapportion(self, a, b):
+        self._priorities(a)
+        self._priorities(b)
+        n_states = len(self.states)
+        changed = set()
+        while True:
+            # the highest next priority, the later state if tied, and the
+            # lowest last priority, the earlier state if tied
+            j = n_states - 1 - int(np.argmax(self.next_priority[::-1]))
+            k = int(np.argmin(self.last_priority))
+            q, r = self.next_priority[j], self.last_priority[k]
+            if q < r or (q == r and j < k):
+                return changed
+            self.seats[j] += 1
+            self.seats[k] -= 1
+            self._priorities(j)
+            self._priorities(k)
+            changed.update((j, k))
+
+    def _toggle_cut(self, e, is_cut):
+        if is_cut:
+            self.cut_position[e] = len(self.cut)
+            self.cut.append(e)
+        else:
+            # the last cut edge takes the place of the one removed
+            p = self.cut_position[e]
+            last = self.cut.pop()
+            if last != e:
+                self.cut[p] = last
+                self.cut_position[last] = p
+            self.cut_position[e] = -1
+
+    # True if the counties of state around county v stay connected without
+    # it: a search from one neighbour in state, stopped as soon as it has
+    # found all the others, which is usually a few counties away
+    def _stays_connected(self, v, state):
+        assignment = self.assignment
+        same = [x for x, e in self.incident[v] if assignment[x] == state]
+        if len(same) <= 1:
+            return True
+        wanted = set(same[1:])
+        seen = set([v, same[0]])
+        queue = [same[0]]
+        while queue:
+            x = queue.pop()
+            for y, e in self.incident[x]:
+                if y in seen or assignment[y] != state:
+                    continue
+                if y in wanted:
+                    wanted.discard(y)
+                    if not wanted:
+                        return True
+                seen.add(y)
+                queue.append(y)
+        return False
+
+    # One proposed move: a random cut edge and one of its ends, which joins
+    # the state at the other end. Returns True if the move was made
+    def step(self):
+        self.steps += 1
+        rng = self.rng
+        if not self.cut:
+            return False
+        u, w = self.edges[self.cut[int(rng.random() * len(self.cut))]]
+        if rng.random() < 0.5:
+            u, w = w, u
+        assignment = self.assignment
+        v, source, target = u, assignment[u], assignment[w]
+        if self.counts[source] == 1:
+            return False
+        if self.pop_bounds is not None:
+            lo, hi = self.pop_bounds
+            pop = self.values[v, 0]
+            if self.totals[source, 0] - pop < lo[source] or self.totals[target, 0] + pop > hi[target]:
+                return False
+
+        # neighbours of v in the state it leaves and the state it joins:
+        # the edges to the first become cut, those to the second no longer are
+        to_source = to_target = 0
+        for x, e in self.incident[v]:
+            if assignment[x] == source:
+                to_source += 1
+            elif assignment[x] == target:
+                to_target += 1
+        if self.reversible:
+            # the reverse move is proposed through any of the to_source edges
+            # out of the cut after, this one through any of to_target before
+            n_cut = len(self.cut)
+            n_after = n_cut + to_source - to_target
+            if rng.random() * to_target * n_after >= to_source * n_cut:
+                return False
+        if not self._stays_connected(v, source):
+            return False
+
+        assignment[v] = target
+        self.counts[source] -= 1
+        self.counts[target] += 1
+        self.totals[source] -= self.values[v]
+        self.totals[target] += self.values[v]
+        for x, e in self.incident[v]:
+            if assignment[x] == source:
+                self._toggle_cut(e, True)
+            elif assignment[x] == target:
+                self._toggle_cut(e, False)
+
+        changed = self._reapportion(source, target)
+        changed.update((source, target))
+        for s in changed:
+            gop = int(self.seats[s] + self.extras) if self.totals[s, 2] > self.totals[s, 1] else 0
+            self.gop_ev += gop - self.gop_by_state[s]
+            self.gop_by_state[s] = gop
+        self.accepted += 1
+        return True
+
+    # Runs n_steps steps and returns, every thin steps, the step number, the
+    # gop and dem electoral votes and the number of cut edges, in the layout
+    # of run_ensemble. assignments=True also keeps the state code of every
+    # county at those steps
+    def run(self, n_steps, thin=1, assignments=False):
+        rows = n_steps // thin
+        table = {'step': np.zeros(rows, dtype=np.int64),
+                 'gop': np.zeros(rows, dtype=np.int16),
+                 'dem': np.zeros(rows, dtype=np.int16),
+                 'cut_edges': np.zeros(rows, dtype=np.int64)}
+        if assignments:
+            table['assignment'] = np.zeros((rows, len(self.assignment)), dtype=np.int16)
+        accepted = self.accepted
+        with profiling.span('randomstates.flip_chain'):
+            row = 0
+            for i in range(1, n_steps + 1):
+                self.step()
+                if i % thin == 0:
+                    table['step'][row] = self.steps
+                    table['gop'][row] = self.gop_ev
+                    table['dem'][row] = self.total_ev - self.gop_ev
+                    table['cut_edges'][row] = len(self.cut)
+                    if assignments:
+                        table['assignment'][row] = self.assignment
+                    row += 1
+            profiling.count('steps', n_steps)
+            profiling.count('flips accepted', self.accepted - accepted)
+        table['states'] = list(self.states)
+        return table
+
+    # The state label of every county as the chain stands
+    def labels(self):
+        return list(np.array(self.states, dtype=object)[self.assignment])
+
+    # Recomputes the totals, cut edges, apportionment and tally from scratch
+    # and raises a RuntimeError if the running values have drifted from them
+    def check(self):
+        codes = np.asarray(self.assignment)
+        edges = np.asarray(self.edges)
+        totals = state_totals(codes, self.values, len(self.states))
+        seats = apportion_batch(totals[:, 0], self.states, initial=self.initial,
+                                extras=self.extras, exclude=self.states[self.exclude])[0]
+        cut = set(np.nonzero(codes[edges[:, 0]] != codes[edges[:, 1]])[0].tolist())
+        gop_ev = int((seats * (totals[:, 2] > totals[:, 1])).sum())
+        if not np.array_equal(totals, self.totals):
+            raise RuntimeError('state totals have drifted')
+        if cut != set(self.cut):
+            raise RuntimeError('cut edges have drifted')
+        if not np.array_equal(seats, self.seats + self.extras):
+            raise RuntimeError('apportionment has drifted')
+        if gop_ev != self.gop_ev:
+            raise RuntimeError('electoral vote tally has drifted')
+        return True
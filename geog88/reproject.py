@@ -0,0 +1,161 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+from ._lazy import lazy_import
+
+pd = lazy_import('pandas', globals(), 'pd')
+pyproj = lazy_import('pyproj', globals(), 'pyproj')
+shapely = lazy_import('shapely', globals(), 'shapely', also=['shapely.ops'])
+gpd = lazy_import('geopandas', globals(), 'gpd')
+
+# Reprojection with memory. to_crs(layer, crs) does what layer.to_crs(crs)
+# does, but pushes every coordinate of the layer through pyproj in one
+# call, and keeps the result: asking again for the same layer in the same
+# crs, after flipping through a few others, costs a hash of the layer
+#
+#   qp.quickplot(reproject.to_crs(world, epsg=3857))
+#   qp.quickplot(reproject.to_crs(world, '+proj=moll +lon_0=0 +datum=WGS84 +units=m +no_defs'))
+#   qp.quickplot(reproject.to_crs(world, epsg=3857))   # straight from the cache
+
+
+# reprojected geometries keyed on (layer fingerprint, source crs, target
+# crs) and evicted least recently used first
+reproject_cache = OrderedDict()
+reproject_cache_size = 16
+
+# transformers between pairs of crs, which are slow to set up
+transformer_cache = OrderedDict()
+transformer_cache_size = 16
+
+
+# A string that names crs the same way however it was given: an
+# epsg code, a proj4 string or dict, a WKT string or a pyproj CRS
+def crs_key(crs):
+    if crs is None:
+        return None
+    if hasattr(pyproj, 'CRS'):
+        return pyproj.CRS.from_user_input(crs).to_wkt()
+    if isinstance(crs, dict):
+        return ' '.join('+%s=%s' % (k, v) for k, v in sorted(crs.items()))
+    return str(crs)
+
+
+# older pyproj only knows epsg codes given as init
+def _proj(crs):
+    if isinstance(crs, str) and crs.lower().startswith('epsg:'):
+        crs = {'init': crs.lower()}
+    if isinstance(crs, dict):
+        return pyproj.Proj(preserve_units=True, **crs)
+    return pyproj.Proj(crs, preserve_units=True)
+
+
+# A function taking x and y arrays from src to dst crs, made once per pair
+def transformer(src, dst):
+    key = (crs_key(src), crs_key(dst))
+    if key in transformer_cache:
+        transformer_cache.move_to_end(key)
+        return transformer_cache[key]
+    if hasattr(pyproj, 'Transformer'):
+        # always_xy keeps longitude first, as shapely has it
+        func = pyproj.Transformer.from_crs(src, dst, always_xy=True).transform
+    else:
+        src_proj, dst_proj = _proj(src), _proj(dst)
+
+        def func(x, y):
+            return pyproj.transform(src_proj, dst_proj, x, y)
+    transformer_cache[key] = func
+    while len(transformer_cache) > transformer_cache_size:
+        transformer_cache.popitem(last=False)
+    return func
+
+
+# Hash of the geometries in geoms, which tells layers apart by content and
+# not by identity, so a layer read twice or sliced the same way twice
+# shares its cache entries. On shapely 2 it hashes the flat coordinate
+# array and the shape of each geometry, which is much quicker than WKB
+def fingerprint(geoms):
+    digest = hashlib.sha1()
+    if hasattr(shapely, 'get_coordinates'):
+        for a in (shapely.get_coordinates(geoms), shapely.get_type_id(geoms),
+                  shapely.get_num_geometries(geoms), shapely.get_num_coordinates(geoms)):
+            digest.update(np.ascontiguousarray(a).tobytes())
+    else:
+        for geom in geoms:
+            digest.update(b'' if geom is None else geom.wkb)
+    return digest.hexdigest()
+
+
+# The geometries in geoms taken from src to dst crs with a single pyproj
+# call over the flat array of all their coordinates
+def transform_geometries(geoms, src, dst):
+    func = transformer(src, dst)
+    geoms = np.asarray(geoms, dtype=object)
+    if hasattr(shapely, 'get_coordinates'):
+        coords = shapely.get_coordinates(geoms)
+        x, y = func(coords[:, 0], coords[:, 1])
+        # set_coordinates swaps the geometries in the array it is given for
+        # rebuilt ones, so give it a copy
+        return shapely.set_coordinates(geoms.copy(), np.column_stack([x, y]))
+
+    # older shapely: one walk to collect the coordinates, in the order
+    # shapely.ops.transform visits them, and a second to put them back
+    xs, ys = [], []
+
+    def collect(x, y, z=None):
+        xs.append(np.asarray(x, dtype=float))
+        ys.append(np.asarray(y, dtype=float))
+        return x, y
+
+    for geom in geoms:
+        if geom is not None and not geom.is_empty:
+            shapely.ops.transform(collect, geom)
+    if len(xs) == 0:
+        return geoms.copy()
+    x, y = func(np.concatenate(xs), np.concatenate(ys))
+    cursor = [0]
+
+    def replace(old_x, old_y, z=None):
+        start = cursor[0]
+        cursor[0] = start + len(old_x)
+        return x[start:cursor[0]], y[start:cursor[0]]
+
+    result = np.empty(len(geoms), dtype=object)
+    for i, geom in enumerate(geoms):
+        if geom is not None and not geom.is_empty:
+            result[i] = shapely.ops.transform(replace, geom)
+        else:
+            result[i] = geom
+    return result
+
+
+# layer (a GeoDataFrame or GeoSeries) in another crs, given like the
+# arguments of its to_crs method. The reprojected geometries are cached,
+# the attribute columns are always those of layer as it is now
+def to_crs(layer, crs=None, epsg=None):
+    if epsg is not None:
+        crs = 'epsg:%d' % epsg
+    if crs is None:
+        raise ValueError('Must pass either crs or epsg.')
+    if layer.crs is None:
+        raise ValueError('Cannot transform naive geometries.  Please set a crs on the object first.')
+
+    geoseries = layer.geometry if isinstance(layer, gpd.GeoDataFrame) else layer
+    geoms = np.asarray(geoseries.values, dtype=object)
+    key = (fingerprint(geoms), crs_key(layer.crs), crs_key(crs))
+    if key in reproject_cache:
+        reproject_cache.move_to_end(key)
+        projected = reproject_cache[key]
+    else:
+        projected = transform_geometries(geoms, layer.crs, crs)
+        reproject_cache[key] = projected
+        while len(reproject_cache) > reproject_cache_size:
+            reproject_cache.popitem(last=False)
+
+    result = gpd.GeoSeries(projected, index=geoseries.index, crs=crs, name=geoseries.name)
+    if isinstance(layer, gpd.GeoDataFrame):
+        frame = pd.DataFrame(layer.drop(geoseries.name, axis=1))
+        frame.insert(list(layer.columns).index(geoseries.name), geoseries.name, result)
+        return gpd.GeoDataFrame(frame, geometry=geoseries.name, crs=crs)
+    return result
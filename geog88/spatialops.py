@@ -0,0 +1,380 @@
+import math
+import multiprocessing
+
+import numpy as np
+
+from ._lazy import lazy_import
+
+pd = lazy_import('pandas', globals(), 'pd')
+shapely = lazy_import('shapely', globals(), 'shapely',
+                      also=['shapely.geometry', 'shapely.prepared'])
+
+# Aggregating one layer onto the polygons of another without a full
+# spatial join: candidate pairs come from a spatial index, exact
+# predicates are only evaluated for those, and the totals per polygon are
+# a single bincount
+#
+#   cases = count_points_in_polygons(ufo_ca, ca, weights=ufo_ca[['cases']])
+#   ufos_by_county = ca.join(cases)
+#
+#   roads = line_length_in_polygons(routes, ca)
+#   ca['road_km'] = roads['length'] / 1000
+
+
+# Geometries of a GeoDataFrame, GeoSeries or geoio layer as an object array
+def geometry_array(layer):
+    geoms = getattr(layer, 'geometry', layer)
+    return np.asarray(getattr(geoms, 'values', geoms), dtype=object)
+
+
+# x and y of a layer of Points as arrays. points can also be an (x, y) pair
+def point_xy(points):
+    if isinstance(points, tuple):
+        return np.asarray(points[0], dtype=float), np.asarray(points[1], dtype=float)
+    if hasattr(points, 'ragged_buffers'):
+        coords = points.ragged_buffers()[0]
+        return np.asarray(coords[:, 0]), np.asarray(coords[:, 1])
+    geoms = geometry_array(points)
+    if hasattr(shapely, 'get_x'):
+        return shapely.get_x(geoms), shapely.get_y(geoms)
+    return (np.array([p.x for p in geoms], dtype=float),
+            np.array([p.y for p in geoms], dtype=float))
+
+
+# weights as a 2D float array with a name per column: a DataFrame gives
+# its columns, a Series its name and an array is called 'weight'
+def _weight_columns(weights, n):
+    if weights is None:
+        return np.zeros((n, 0)), []
+    if isinstance(weights, pd.DataFrame):
+        return weights.values.astype(float), list(weights.columns)
+    name = getattr(weights, 'name', None) or 'weight'
+    return np.asarray(weights, dtype=float).reshape(n, 1), [name]
+
+
+# How a point on the boundary of a polygon counts:
+#   'first'    it counts once, for the first polygon whose boundary or
+#              interior it lies in (the default, so points on shared
+#              edges are neither lost nor double counted)
+#   'all'      it counts for every polygon whose boundary or interior it
+#              lies in
+#   'interior' only points strictly inside a polygon count
+boundary_rules = ('first', 'all', 'interior')
+
+
+class PolygonIndex(object):
+    # Finds the polygons points fall in without making a shapely Point for
+    # each of them. A grid of about cells_per_polygon square cells per
+    # polygon is laid over the layer and every cell bulk-queried against an
+    # STRtree of the polygons once. A cell that meets no polygon drops its
+    # points, a cell that lies inside a single polygon and meets no other
+    # gives its points to that polygon outright, and only the points in the
+    # cells left over are tested exactly, one prepared polygon at a time
+    # against the candidates of their cell. Needs shapely 2
+
+    def __init__(self, polygons, cells_per_polygon=64):
+        self.polygons = np.asarray(polygons, dtype=object)
+        shapely.prepare(self.polygons)
+        tree = shapely.STRtree(self.polygons)
+        n = len(self.polygons)
+        xmin, ymin, xmax, ymax = shapely.total_bounds(self.polygons)
+        area = max((xmax - xmin) * (ymax - ymin), 1e-12)
+        self.size = math.sqrt(area / max(n * cells_per_polygon, 1))
+        self.origin = (xmin, ymin)
+        self.shape = (max(int(math.ceil((xmax - xmin) / self.size)), 1),
+                      max(int(math.ceil((ymax - ymin) / self.size)), 1))
+
+        col, row = np.meshgrid(np.arange(self.shape[0]), np.arange(self.shape[1]), indexing='ij')
+        col, row = col.ravel(), row.ravel()
+        boxes = shapely.box(xmin + col * self.size, ymin + row * self.size,
+                            xmin + (col + 1) * self.size, ymin + (row + 1) * self.size)
+        cell_idx, poly_idx = tree.query(boxes, predicate='intersects')
+        order = np.lexsort((poly_idx, cell_idx))
+        cell_idx, poly_idx = cell_idx[order], poly_idx[order]
+        hits = np.bincount(cell_idx, minlength=len(boxes))
+
+        # the candidates of every cell, as CSR arrays
+        self.starts = np.concatenate([[0], np.cumsum(hits)])
+        self.candidates = poly_idx
+        # the polygon a cell lies inside of, -1 for none and -2 for cells
+        # whose points must be tested
+        self.owner = np.where(hits == 0, -1, -2)
+        single = hits[cell_idx] == 1
+        inside = shapely.contains_properly(self.polygons[poly_idx[single]], boxes[cell_idx[single]])
+        self.owner[cell_idx[single][inside]] = poly_idx[single][inside]
+
+    # Cell of every point, -1 outside the grid
+    def cells(self, x, y):
+        col = np.floor((x - self.origin[0]) / self.size)
+        row = np.floor((y - self.origin[1]) / self.size)
+        nx, ny = self.shape
+        # points on the far edges belong to the last cells
+        col[col == nx] = nx - 1
+        row[row == ny] = ny - 1
+        outside = ~((col >= 0) & (col < nx) & (row >= 0) & (row < ny))
+        cell = (np.where(outside, 0, col) * ny + np.where(outside, 0, row)).astype(np.int64)
+        cell[outside] = -1
+        return cell
+
+    # (point, polygon) index pairs for every point in a polygon, counting
+    # points on a boundary (boundary='interior' leaves those out)
+    def pairs(self, x, y, boundary='all'):
+        cell = self.cells(x, y)
+        owner = np.where(cell >= 0, self.owner[cell], -1)
+        sure = np.nonzero(owner >= 0)[0]
+
+        # every remaining point paired with each candidate of its cell,
+        # then sorted by polygon so each polygon is tested in one call
+        test = np.nonzero(owner == -2)[0]
+        reps = self.starts[cell[test] + 1] - self.starts[cell[test]]
+        point_idx = np.repeat(test, reps)
+        first = np.repeat(self.starts[cell[test]] - np.cumsum(reps) + reps, reps)
+        poly_idx = self.candidates[first + np.arange(len(point_idx))]
+        order = np.argsort(poly_idx, kind='mergesort')
+        point_idx, poly_idx = point_idx[order], poly_idx[order]
+
+        predicate = shapely.contains_xy if boundary == 'interior' else shapely.intersects_xy
+        keep = np.zeros(len(point_idx), dtype=bool)
+        bounds = np.searchsorted(poly_idx, np.arange(len(self.polygons) + 1))
+        for p in np.nonzero(np.diff(bounds))[0]:
+            a, b = bounds[p], bounds[p + 1]
+            keep[a:b] = predicate(self.polygons[p], x[point_idx[a:b]], y[point_idx[a:b]])
+        return (np.concatenate([sure, point_idx[keep]]),
+                np.concatenate([owner[sure], poly_idx[keep]]))
+
+
+# The polygon each point falls in as (point, polygon) index pairs, under
+# one of the boundary rules above. index is a PolygonIndex of polygons,
+# made here if not given
+def point_polygon_pairs(x, y, polygons, boundary='first', index=None):
+    if boundary not in boundary_rules:
+        raise ValueError('boundary should be one of %s' % (boundary_rules,))
+    if hasattr(shapely, 'contains_xy'):
+        if index is None:
+            index = PolygonIndex(polygons)
+        point_idx, poly_idx = index.pairs(x, y, boundary)
+    else:
+        point_idx, poly_idx = _pairs_by_polygon(x, y, polygons, boundary)
+
+    if boundary == 'first' and len(point_idx) > 0:
+        order = np.lexsort((poly_idx, point_idx))
+        point_idx, poly_idx = point_idx[order], poly_idx[order]
+        first = np.ones(len(point_idx), dtype=bool)
+        first[1:] = point_idx[1:] != point_idx[:-1]
+        point_idx, poly_idx = point_idx[first], poly_idx[first]
+    return point_idx, poly_idx
+
+
+# older shapely: a bounding box mask over the coordinates for every polygon,
+# then the vectorized point tests on what is left
+def _pairs_by_polygon(x, y, polygons, boundary):
+    import shapely.vectorized
+    point_idx, poly_idx = [], []
+    for i, poly in enumerate(polygons):
+        if poly is None or poly.is_empty:
+            continue
+        xmin, ymin, xmax, ymax = poly.bounds
+        candidates = np.nonzero((x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax))[0]
+        if len(candidates) == 0:
+            continue
+        cx, cy = x[candidates], y[candidates]
+        inside = shapely.vectorized.contains(shapely.prepared.prep(poly), cx, cy)
+        if boundary != 'interior':
+            inside |= shapely.vectorized.touches(poly, cx, cy)
+        point_idx.append(candidates[inside])
+        poly_idx.append(np.full(inside.sum(), i, dtype=np.int64))
+    if len(point_idx) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(point_idx), np.concatenate(poly_idx)
+
+
+# Count and weighted sums per polygon for one block of points: an
+# (n_polygons, 1 + n_weights) array
+def _count_block(x, y, w, polygons, boundary, index=None):
+    point_idx, poly_idx = point_polygon_pairs(x, y, polygons, boundary, index)
+    totals = np.empty((len(polygons), 1 + w.shape[1]))
+    totals[:, 0] = np.bincount(poly_idx, minlength=len(polygons))
+    for k in range(w.shape[1]):
+        totals[:, 1 + k] = np.bincount(poly_idx, weights=w[point_idx, k], minlength=len(polygons))
+    return totals
+
+
+_worker_polygons = None
+_worker_index = None
+
+
+def _init_worker(polygons):
+    global _worker_polygons, _worker_index
+    _worker_polygons = polygons
+    if hasattr(shapely, 'contains_xy'):
+        _worker_index = PolygonIndex(polygons)
+
+
+def _count_chunk(task):
+    x, y, w, boundary = task
+    return _count_block(x, y, w, _worker_polygons, boundary, _worker_index)
+
+
+# Counts the points that fall in each polygon, and with weights (a column
+# of values per point, or a DataFrame of several) also sums them per
+# polygon. boundary picks the rule for points on polygon boundaries, see
+# boundary_rules. Returns a DataFrame with the index of polygons, a
+# 'count' column and a column per weight, ready to join onto polygons.
+# Points are processed chunk_size at a time, over a pool of processes
+# unless processes=1; the totals are the same either way
+def count_points_in_polygons(points, polygons, weights=None, boundary='first',
+                             processes=None, chunk_size=1000000):
+    x, y = point_xy(points)
+    w, names = _weight_columns(weights, len(x))
+    geoms = geometry_array(polygons)
+
+    tasks = [(x[i:i + chunk_size], y[i:i + chunk_size], w[i:i + chunk_size], boundary)
+             for i in range(0, len(x), chunk_size)]
+    if processes == 1 or len(tasks) <= 1:
+        _init_worker(geoms)
+        results = map(_count_chunk, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(processes, initializer=_init_worker, initargs=(geoms,))
+        results = pool.imap(_count_chunk, tasks)
+    try:
+        # summed in chunk order, so the weighted sums do not depend on
+        # which process finished first
+        totals = np.zeros((len(geoms), 1 + len(names)))
+        for block in results:
+            totals += block
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+    index = getattr(polygons, 'index', None)
+    table = pd.DataFrame(totals[:, 1:], columns=names, index=index)
+    table.insert(0, 'count', totals[:, 0].astype(np.int64))
+    return table
+
+
+# The parts of the lines in geoms, with the position of the feature each
+# came from. Long multi part features, whole routes say, become pieces
+# that are more often inside a single zone, and smaller to clip when not
+def line_parts(geoms):
+    if hasattr(shapely, 'get_parts'):
+        return shapely.get_parts(geoms, return_index=True)
+    parts, index = [], []
+    for i, geom in enumerate(geoms):
+        if geom is None or geom.is_empty:
+            continue
+        pieces = geom.geoms if hasattr(geom, 'geoms') else [geom]
+        parts.extend(pieces)
+        index.extend([i] * len(pieces))
+    return np.asarray(parts, dtype=object), np.asarray(index, dtype=np.int64)
+
+
+# Length of every line part inside every zone it meets, as (part, zone,
+# length) arrays for the zones numbered from offset on. Candidate pairs
+# come from a bounding box query, parts a prepared zone covers count
+# whole, and only those crossing its boundary are clipped with an exact
+# intersection
+def part_zone_lengths(parts, zones, tree=None, offset=0):
+    if hasattr(shapely, 'STRtree') and hasattr(shapely, 'covers'):
+        if tree is None:
+            tree = shapely.STRtree(parts)
+        zones = np.asarray(zones, dtype=object)
+        shapely.prepare(zones)
+        zone_idx, part_idx = tree.query(zones)
+        length = shapely.length(parts[part_idx])
+        inside = shapely.covers(zones[zone_idx], parts[part_idx])
+        rest = np.nonzero(~inside)[0]
+        # bounding boxes that meet with the lines missing the zone are
+        # common, and the prepared test rules them out far more cheaply
+        # than an intersection would
+        meets = shapely.intersects(zones[zone_idx[rest]], parts[part_idx[rest]])
+        length[rest[~meets]] = 0
+        clip = rest[meets]
+        length[clip] = shapely.length(shapely.intersection(parts[part_idx[clip]],
+                                                           zones[zone_idx[clip]]))
+        keep = length > 0
+        return part_idx[keep], zone_idx[keep] + offset, length[keep]
+
+    # older shapely: bounds compared as arrays, one zone at a time
+    bounds = np.array([p.bounds for p in parts]).reshape(-1, 4)
+    part_idx, zone_idx, lengths = [], [], []
+    for i, zone in enumerate(zones):
+        if zone is None or zone.is_empty:
+            continue
+        xmin, ymin, xmax, ymax = zone.bounds
+        candidates = np.nonzero((bounds[:, 0] <= xmax) & (bounds[:, 2] >= xmin) &
+                                (bounds[:, 1] <= ymax) & (bounds[:, 3] >= ymin))[0]
+        prepared = shapely.prepared.prep(zone)
+        for k in candidates:
+            if prepared.covers(parts[k]):
+                length = parts[k].length
+            elif prepared.intersects(parts[k]):
+                length = parts[k].intersection(zone).length
+            else:
+                continue
+            if length > 0:
+                part_idx.append(k)
+                zone_idx.append(i + offset)
+                lengths.append(length)
+    return (np.asarray(part_idx, dtype=np.int64), np.asarray(zone_idx, dtype=np.int64),
+            np.asarray(lengths, dtype=float))
+
+
+_worker_parts = None
+_worker_part_tree = None
+
+
+def _init_line_worker(parts):
+    global _worker_parts, _worker_part_tree
+    _worker_parts = parts
+    if hasattr(shapely, 'STRtree') and hasattr(shapely, 'covers'):
+        _worker_part_tree = shapely.STRtree(parts)
+
+
+def _lengths_chunk(task):
+    offset, zones = task
+    return part_zone_lengths(_worker_parts, zones, _worker_part_tree, offset)
+
+
+# Length of every line feature inside every polygon it crosses, as (line,
+# polygon, length) arrays: the overlay of lines and polygons reduced to the
+# numbers. Polygons are handled chunk_size at a time over a pool of
+# processes, unless processes=1
+def line_polygon_lengths(lines, polygons, processes=None, chunk_size=500):
+    parts, line_of_part = line_parts(geometry_array(lines))
+    zones = geometry_array(polygons)
+
+    tasks = [(i, zones[i:i + chunk_size]) for i in range(0, len(zones), chunk_size)]
+    if processes == 1 or len(tasks) <= 1:
+        _init_line_worker(parts)
+        results = list(map(_lengths_chunk, tasks))
+    else:
+        pool = multiprocessing.Pool(processes, initializer=_init_line_worker, initargs=(parts,))
+        try:
+            results = pool.map(_lengths_chunk, tasks)
+        finally:
+            pool.terminate()
+
+    if len(results) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0)
+    part_idx, zone_idx, length = [np.concatenate(r) for r in zip(*results)]
+    return line_of_part[part_idx], zone_idx, length
+
+
+# Total length of lines inside each polygon, and with weights (a value per
+# line, or a DataFrame of several) the length weighted by each. Lines are
+# clipped to the polygons, so a road crossing three counties adds to each
+# only the length inside it, unlike a spatial join that counts all of it
+# three times. Returns a DataFrame with the index of polygons, a 'length'
+# column in the units of the layers' crs and a column per weight
+def line_length_in_polygons(lines, polygons, weights=None, processes=None, chunk_size=500):
+    line_idx, zone_idx, length = line_polygon_lengths(lines, polygons, processes, chunk_size)
+    n = len(geometry_array(polygons))
+    w, names = _weight_columns(weights, len(geometry_array(lines)))
+    table = pd.DataFrame(
+        dict((name, np.bincount(zone_idx, weights=length * w[line_idx, k], minlength=n))
+             for k, name in enumerate(names)),
+        columns=names, index=getattr(polygons, 'index', None))
+    table.insert(0, 'length', np.bincount(zone_idx, weights=length, minlength=n))
+    return table
@@ -0,0 +1,411 @@
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+
+import numpy as np
+
+from . import quickplot as qp
+from . import classify
+from . import profiling
+from . import reproject
+from ._lazy import lazy_import
+
+matplotlib = lazy_import('matplotlib', globals(), 'matplotlib', also=['matplotlib.colors', 'matplotlib.cm'])
+mpc = lazy_import('matplotlib.collections', globals(), 'mpc')
+mfigure = lazy_import('matplotlib.figure', globals(), 'mfigure')
+magg = lazy_import('matplotlib.backends.backend_agg', globals(), 'magg')
+shapely = lazy_import('shapely', globals(), 'shapely', also=['shapely.geometry'])
+
+# Renders a layer into a pyramid of XYZ map tiles on disk, the z/x/y.png
+# layout Leaflet, OpenLayers and most web maps read, instead of sending
+# every vertex to the browser as mplleaflet does. A browser then loads the
+# few dozen 256 pixel tiles covering its view, however big the layer
+#
+#   tiles.export_tiles(counties, 'tiles/counties', column='nPop', cmap='Blues',
+#                      scheme='quantiles', zooms=range(0, 10))
+#   # open tiles/counties/index.html, or point a tile layer at the directory
+#
+# Each zoom level draws the layer simplified to its pixel size. A grid
+# index of feature bounding boxes finds the features under each tile, and
+# features crossing the tile's edge are clipped to it before drawing. The
+# tiles are rendered over a pool of processes, and a manifest of what went
+# into each tile means running the export again only redraws the tiles
+# whose features or style changed
+
+# half the width of the web mercator (EPSG:3857) world, in metres
+world = 20037508.342789244
+manifest_name = 'tiles.json'
+
+
+# (xmin, ymin, xmax, ymax) of tile x, y at zoom z in web mercator, tile
+# rows counted down from the top as XYZ tiles are
+def tile_bounds(z, x, y):
+    size = 2 * world / 2 ** z
+    return (-world + x * size, world - (y + 1) * size,
+            -world + (x + 1) * size, world - y * size)
+
+
+# Size of a tile pixel in metres at zoom z
+def pixel_size(z, tile_size=256):
+    return 2 * world / (tile_size * 2 ** z)
+
+
+# The tiles at zoom z that the (n, 4) bounds of features overlap, grown by
+# margin metres: returns the tiles' x and y, and offsets into the features
+# listed under each, the CSR layout of spatialops.PolygonIndex. Features
+# with no bounds (missing or empty) are under no tile
+def tile_index(bounds, z, margin=0.0):
+    n_tiles = 2 ** z
+    size = 2 * world / n_tiles
+    bounds = np.asarray(bounds, dtype=float).reshape(-1, 4)
+    valid = np.isfinite(bounds).all(axis=1)
+    b = np.where(valid[:, None], bounds, 0.0)
+
+    def cell(v):
+        return np.clip(np.floor(v / size).astype(np.int64), 0, n_tiles - 1)
+    x0, x1 = cell(b[:, 0] - margin + world), cell(b[:, 2] + margin + world)
+    y0, y1 = cell(world - b[:, 3] - margin), cell(world - b[:, 1] + margin)
+    ny = y1 - y0 + 1
+    counts = np.where(valid, (x1 - x0 + 1) * ny, 0)
+
+    # one (tile, feature) pair for every tile in every feature's range
+    feature = np.repeat(np.arange(len(b)), counts)
+    k = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    tx = x0[feature] + k // ny[feature]
+    ty = y0[feature] + k % ny[feature]
+    key = tx * n_tiles + ty
+    order = np.argsort(key, kind='mergesort')
+    key, feature = key[order], feature[order]
+    first = np.ones(len(key), dtype=bool)
+    first[1:] = key[1:] != key[:-1]
+    starts = np.flatnonzero(first)
+    offsets = np.concatenate([starts, [len(key)]])
+    return key[starts] // n_tiles, key[starts] % n_tiles, offsets, feature
+
+
+def _bounds(geoms):
+    if hasattr(shapely, 'bounds'):
+        return shapely.bounds(geoms)
+    return np.array([g.bounds if g is not None and not g.is_empty else (np.nan,) * 4
+                     for g in geoms], dtype=float).reshape(-1, 4)
+
+
+def _simplify(geoms, tolerance):
+    if hasattr(shapely, 'simplify'):
+        return shapely.simplify(geoms, tolerance)
+    return np.array([g if g is None else g.simplify(tolerance) for g in geoms], dtype=object)
+
+
+# type ids of the geometries each kind of layer draws
+_drawn_types = {'polygon': (3, 6), 'line': (1, 5)}
+
+
+# geoms clipped to box, keeping only the polygons or lines of the result
+# (clipping can leave slivers of lower dimension, or nothing)
+def _clip(geoms, box, kind):
+    if hasattr(shapely, 'clip_by_rect'):
+        clipped = shapely.clip_by_rect(geoms, *box)
+        type_ids = shapely.get_type_id(clipped)
+        keep = np.isin(type_ids, _drawn_types[kind])
+        for i in np.flatnonzero(~keep & (type_ids == 7)):
+            parts = shapely.get_parts(clipped[i])
+            parts = parts[np.isin(shapely.get_type_id(parts), _drawn_types[kind][:1])]
+            if len(parts) > 0:
+                clipped[i] = (shapely.multipolygons(parts) if kind == 'polygon'
+                              else shapely.multilinestrings(parts))
+                keep[i] = True
+        clipped[~keep] = None
+        return clipped
+
+    # older shapely: an intersection per geometry
+    rect = shapely.geometry.box(*box)
+    clipped = np.empty(len(geoms), dtype=object)
+    for i, geom in enumerate(geoms):
+        part = geom.intersection(rect) if geom is not None else None
+        if part is not None and part.geom_type == 'GeometryCollection':
+            parts = [p for p in part.geoms if p.geom_type in ('Polygon', 'LineString')]
+            if len(parts) == 0:
+                part = None
+            elif kind == 'polygon':
+                part = shapely.geometry.MultiPolygon(parts)
+            else:
+                part = shapely.geometry.MultiLineString(parts)
+        if part is not None and (part.is_empty or part.geom_type not in (
+                'Polygon', 'MultiPolygon', 'LineString', 'MultiLineString')):
+            part = None
+        clipped[i] = part
+    return clipped
+
+
+# The fill color (stroke color for lines) of every feature as an (n, 4)
+# RGBA array, worked out as quickplot colors a layer: by column through
+# cmap, by class under scheme, or all in facecolor
+def feature_colors(gdf, column=None, cmap='Set1', facecolor=None, scheme=None, k=5,
+                   alpha=1.0):
+    n = len(gdf)
+    if column is None:
+        if facecolor is None:
+            facecolor = matplotlib.rcParams['patch.facecolor']
+        colors = np.tile(matplotlib.colors.to_rgba(facecolor), (n, 1))
+    else:
+        values = np.asarray(gdf[column], dtype=float)
+        if scheme is not None:
+            b = classify.breaks(values, scheme, k)
+            values = classify.classes(values, b)
+            norm = matplotlib.colors.Normalize(0, max(len(b) - 1, 1))
+        else:
+            norm = matplotlib.colors.Normalize()
+            norm.autoscale(values[np.isfinite(values)])
+        colors = matplotlib.cm.ScalarMappable(norm, cmap).to_rgba(values)
+    colors[:, 3] *= alpha
+    return colors
+
+
+_worker_layers = None
+_worker_style = None
+_worker_canvas = None
+
+
+def _init_worker(layers, style):
+    global _worker_layers, _worker_style, _worker_canvas
+    _worker_layers = layers
+    _worker_style = style
+    _worker_canvas = None
+
+
+# One figure the size of a tile, made once per process and reused for
+# every tile it draws
+def _tile_axes():
+    global _worker_canvas
+    if _worker_canvas is None:
+        figure = mfigure.Figure(figsize=(1, 1), dpi=_worker_style['tile_size'])
+        canvas = magg.FigureCanvasAgg(figure)
+        ax = figure.add_axes([0, 0, 1, 1])
+        ax.set_axis_off()
+        _worker_canvas = canvas
+    return _worker_canvas, _worker_canvas.figure.axes[0]
+
+
+# Draws one tile: the features in ids at zoom z, those not wholly inside
+# the tile clipped to it first
+def _render_tile(z, x, y, ids, path):
+    layer = _worker_layers[z]
+    style = _worker_style
+    canvas, ax = _tile_axes()
+    for artist in list(ax.collections):
+        artist.remove()
+
+    xmin, ymin, xmax, ymax = tile_bounds(z, x, y)
+    margin = style['margin'] * pixel_size(z, style['tile_size'])
+    box = (xmin - margin, ymin - margin, xmax + margin, ymax + margin)
+    geoms = layer['geoms'][ids]
+    colors = layer['colors'][ids]
+    kind = style['kind']
+
+    if kind == 'point':
+        xy = layer['xy'][ids]
+        ax.scatter(xy[:, 0], xy[:, 1], s=style['markersize'] ** 2, c=colors, edgecolors='none')
+    else:
+        b = layer['bounds'][ids]
+        inside = ((b[:, 0] >= box[0]) & (b[:, 1] >= box[1]) &
+                  (b[:, 2] <= box[2]) & (b[:, 3] <= box[3]))
+        if not inside.all():
+            geoms = geoms.copy()
+            geoms[~inside] = _clip(geoms[~inside], box, kind)
+            # features whose bounds reach the tile but whose shapes do not
+            drawn = np.array([g is not None for g in geoms], dtype=bool)
+            geoms, colors = geoms[drawn], colors[drawn]
+        if kind == 'polygon' and len(geoms) > 0:
+            coords, ring_offsets, part_offsets, geom_offsets = qp.polygon_buffers(geoms)
+            paths, parts = qp.polygon_paths(coords, ring_offsets, part_offsets)
+            feature_of_part = np.repeat(np.arange(len(geom_offsets) - 1), np.diff(geom_offsets))[parts]
+            ax.add_collection(mpc.PathCollection(
+                paths, facecolors=colors[feature_of_part], edgecolors=style['edgecolor'],
+                linewidths=style['linewidth']))
+        elif len(geoms) > 0:
+            coords, line_offsets, geom_offsets = qp.line_buffers(geoms)
+            lines = np.split(coords, line_offsets[1:-1]) if len(line_offsets) > 1 else []
+            feature_of_part = np.repeat(np.arange(len(geom_offsets) - 1), np.diff(geom_offsets))
+            ax.add_collection(mpc.LineCollection(
+                lines, colors=colors[feature_of_part], linewidths=style['linewidth']))
+
+    ax.set_xlim(xmin, xmax)
+    ax.set_ylim(ymin, ymax)
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    # write then rename, so a browser never reads half a tile
+    tmp = path + '.tmp.png'
+    canvas.figure.savefig(tmp, dpi=style['tile_size'], transparent=True)
+    os.replace(tmp, path)
+
+
+def _render_chunk(task):
+    for z, x, y, ids, path in task:
+        _render_tile(z, x, y, ids, path)
+    return len(task)
+
+
+# Renders gdf (a GeoDataFrame with a crs) into XYZ tiles under directory,
+# directory/z/x/y.png for every zoom in zooms, and returns how many tiles
+# were drawn, left as they were and removed. Colors follow quickplot:
+# column, cmap and scheme/k, or facecolor, and alpha; edgecolor and
+# linewidth (in pixels) stroke polygon outlines and lines. Tiles are drawn
+# chunk_size at a time over a pool of processes, unless processes=1. Tiles
+# no feature reaches are not written, web maps show nothing there, and
+# tiles of zooms already in directory but not in zooms are kept as they
+# are. viewer=True also writes an index.html showing the tiles over
+# OpenStreetMap with Leaflet. An empty layer or zooms raises ValueError
+# before anything in directory is touched
+def export_tiles(gdf, directory, zooms=range(0, 8), column=None, cmap='Set1', scheme=None,
+                 k=5, facecolor=None, edgecolor='k', linewidth=0.5, alpha=1.0, markersize=2,
+                 tile_size=256, processes=None, chunk_size=64, viewer=True):
+    zooms = list(zooms)
+    if len(zooms) == 0:
+        raise ValueError('No zoom levels to export')
+    if len(gdf) == 0:
+        raise ValueError('Cannot export tiles of an empty layer')
+    if gdf.crs is None:
+        raise ValueError('Cannot place naive geometries on a web map.  Please set a crs first.')
+    kind = qp.layer_kind(gdf)
+    if reproject.crs_key(gdf.crs) != reproject.crs_key('epsg:3857'):
+        gdf = reproject.to_crs(gdf, epsg=3857)
+    geoms = np.asarray(gdf.geometry.values, dtype=object)
+    colors = feature_colors(gdf, column, cmap, facecolor, scheme, k, alpha)
+    bounds = _bounds(geoms)
+    if not np.isfinite(bounds).all(axis=1).any():
+        raise ValueError('Cannot export tiles of a layer with no geometry')
+    style = {'kind': kind, 'tile_size': tile_size,
+             'edgecolor': 'none' if edgecolor is None else edgecolor,
+             # linewidth is in pixels, matplotlib wants points
+             'linewidth': linewidth * 72.0 / tile_size,
+             'markersize': markersize * 72.0 / tile_size,
+             # strokes and markers reach this many pixels past a feature's bounds
+             'margin': max(linewidth, markersize if kind == 'point' else 0) + 1}
+
+    # what goes into a tile besides its features; a change redraws them all
+    style_key = json.dumps([kind, tile_size, style['edgecolor'], linewidth, markersize],
+                           sort_keys=True, default=str).encode()
+    # a digest of every feature's geometry and color, from which each tile's
+    # signature is made
+    if hasattr(shapely, 'to_wkb'):
+        wkb = shapely.to_wkb(geoms)
+    else:
+        wkb = [b'' if g is None else g.wkb for g in geoms]
+    digests = [hashlib.sha1((w or b'') + c.tobytes()).digest()
+               for w, c in zip(wkb, np.ascontiguousarray(colors))]
+
+    layers = {}
+    tasks = []
+    signatures = {}
+    for z in zooms:
+        # simplified to half a pixel, which the eye cannot tell apart
+        with profiling.span('tiles.simplify'):
+            zoom_geoms = geoms if kind == 'point' else _simplify(geoms, pixel_size(z, tile_size) / 2)
+        layer = {'geoms': zoom_geoms, 'colors': colors, 'bounds': bounds}
+        if kind == 'point':
+            layer['xy'] = bounds[:, :2]
+        layers[z] = layer
+        margin = style['margin'] * pixel_size(z, tile_size)
+        with profiling.span('tiles.tile_index'):
+            tx, ty, offsets, features = tile_index(bounds, z, margin)
+        for i in range(len(tx)):
+            ids = features[offsets[i]:offsets[i + 1]]
+            name = '%d/%d/%d' % (z, tx[i], ty[i])
+            digest = hashlib.sha1(style_key)
+            digest.update(b''.join(digests[f] for f in ids))
+            signatures[name] = digest.hexdigest()
+            tasks.append((z, int(tx[i]), int(ty[i]), ids,
+                          os.path.join(directory, str(z), str(tx[i]), '%d.png' % ty[i])))
+
+    manifest = os.path.join(directory, manifest_name)
+    previous = {}
+    if os.path.exists(manifest):
+        with open(manifest) as f:
+            previous = json.load(f)['tiles']
+    todo = [t for t in tasks
+            if previous.get('%d/%d/%d' % t[:3]) != signatures['%d/%d/%d' % t[:3]]
+            or not os.path.exists(t[4])]
+    # tiles of zooms not exported this time are left alone, and stay in
+    # the manifest
+    exported = set(str(z) for z in zooms)
+    removed = []
+    for name in previous:
+        if name.split('/')[0] not in exported:
+            signatures.setdefault(name, previous[name])
+        elif name not in signatures:
+            removed.append(name)
+    for name in removed:
+        path = os.path.join(directory, name + '.png')
+        if os.path.exists(path):
+            os.remove(path)
+
+    chunks = [todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size)]
+    if processes == 1 or len(chunks) <= 1:
+        _init_worker(layers, style)
+        results = map(_render_chunk, chunks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(processes, initializer=_init_worker, initargs=(layers, style))
+        results = pool.imap_unordered(_render_chunk, chunks)
+    try:
+        with profiling.span('tiles.render'):
+            rendered = sum(results)
+            profiling.count('tiles rendered', rendered)
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    tmp = manifest + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'tiles': signatures}, f)
+    os.replace(tmp, manifest)
+    if viewer:
+        write_viewer(directory, bounds, set(int(name.split('/')[0]) for name in signatures))
+    return {'rendered': rendered, 'unchanged': len(tasks) - len(todo), 'removed': len(removed),
+            'tiles': len(tasks)}
+
+
+# web mercator x, y to longitude, latitude
+def _lonlat(x, y):
+    return (np.asarray(x) / world * 180.0,
+            np.degrees(2 * np.arctan(np.exp(np.asarray(y) / world * math.pi)) - math.pi / 2))
+
+
+_viewer = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css">
+<script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
+<style>html, body, #map {{ height: 100%; margin: 0; }}</style>
+</head>
+<body>
+<div id="map"></div>
+<script>
+var map = L.map('map');
+L.tileLayer('https://{{s}}.tile.openstreetmap.org/{{z}}/{{x}}/{{y}}.png', {{
+  attribution: '&copy; OpenStreetMap contributors'}}).addTo(map);
+L.tileLayer('{{z}}/{{x}}/{{y}}.png', {{minZoom: {minzoom}, maxNativeZoom: {maxzoom}}}).addTo(map);
+map.fitBounds([[{south}, {west}], [{north}, {east}]]);
+</script>
+</body>
+</html>
+"""
+
+
+# An index.html in directory showing its tiles over OpenStreetMap, zoomed
+# to bounds (web mercator feature bounds, as export_tiles has them)
+def write_viewer(directory, bounds, zooms):
+    bounds = np.asarray(bounds, dtype=float)
+    bounds = bounds[np.isfinite(bounds).all(axis=1)]
+    (west, east), (south, north) = _lonlat([bounds[:, 0].min(), bounds[:, 2].max()],
+                                           [bounds[:, 1].min(), bounds[:, 3].max()])
+    zooms = list(zooms)
+    with open(os.path.join(directory, 'index.html'), 'w') as f:
+        f.write(_viewer.format(minzoom=min(zooms), maxzoom=max(zooms),
+                               south=south, west=west, north=north, east=east))
@@ -0,0 +1,13 @@
+import os
+import sys
+
+# reproject lives in the geog88 package at the top of the repository. This
+# stand-in keeps `import reproject` working in the notebooks here, installed
+# or not, and hands back the package module itself
+try:
+    import geog88
+except ImportError:
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from geog88 import reproject
+
+sys.modules[__name__] = reproject
@@ -0,0 +1,23 @@
+from setuptools import setup
+
+# pip install -e . from the top of the repository makes the notebook
+# modules importable from anywhere as the geog88 package
+
+setup(
+    name='geog88',
+    version='0.1.0',
+    description='Helper modules for the geography-88 notebooks',
+    url='https://github.com/data-8/geography-88',
+    license='MIT',
+    packages=['geog88'],
+    python_requires='>=3.5',
+    install_requires=[
+        'numpy',
+        'pandas',
+        'shapely',
+        'geopandas',
+        'matplotlib',
+        'networkx',
+        'pyproj',
+    ],
+)
@@ -0,0 +1,84 @@
+import math
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# the repository root, so geog88 imports without being installed
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geog88 import randomstates as rs
+
+# The heap apportion and the NumPy apportion_batch against the original
+# notebook apportion, kept here as it was
+
+
+def get_max_idx(L):
+    max_i = 0
+    for i in range(len(L)):
+        if L[i] >= L[max_i]:
+            max_i = i
+    return max_i
+
+
+def remove_i(L, i):
+    return L[:i] + L[i+1:]
+
+
+def insert_i(L, i, x):
+    return L[:i] + [x] + L[i:]
+
+
+def old_apportion(pops, states, seats_to_assign=435, initial=1, extras=2, exclude='DC'):
+    pops = list(pops)
+    states = list(states)
+    assigned = [initial] * len(pops)
+    ex = states.index(exclude)
+    assigned = remove_i(assigned, ex)
+    pops = remove_i(pops, ex)
+    remaining = seats_to_assign - sum(assigned)
+    while remaining > 0:
+        priorities = [p / math.sqrt(a * (a + 1)) for p, a in zip(pops, assigned)]
+        max_priority = get_max_idx(priorities)
+        assigned[max_priority] += 1
+        remaining -= 1
+    assigned = insert_i(assigned, ex, 1)
+    assigned = [__ + 2 for __ in assigned]
+    return assigned
+
+
+states = ['S%02d' % i for i in range(50)] + ['DC']
+
+
+def random_pops(seed):
+    rng = np.random.RandomState(seed)
+    return list(np.round(rng.lognormal(14, 1.0, len(states))))
+
+
+# equal populations, so every seat after the first round is a tie
+tied_pops = [1000000.0] * len(states)
+
+
+@pytest.mark.parametrize('pops', [random_pops(seed) for seed in range(20)] + [tied_pops])
+@pytest.mark.parametrize('kwargs', [{}, {'extras': 0}, {'extras': 5},
+                                    {'seats_to_assign': 100, 'initial': 1},
+                                    {'seats_to_assign': 538, 'initial': 2}])
+def test_apportion_matches_original(pops, kwargs):
+    assert rs.apportion(pops, states, **kwargs) == old_apportion(pops, states, **kwargs)
+
+
+@pytest.mark.parametrize('pops', [random_pops(seed) for seed in range(20)] + [tied_pops])
+def test_apportion_batch_matches_original(pops):
+    assert rs.apportion_numpy(pops, states) == old_apportion(pops, states)
+    batch = rs.apportion_batch([pops, pops[::-1]], states)
+    assert list(batch[0]) == old_apportion(pops, states)
+    assert list(batch[1]) == old_apportion(pops[::-1], states)
+
+
+# apportion_batch adds extras where apportion always adds 2
+@pytest.mark.parametrize('extras', [0, 2, 5])
+def test_apportion_batch_extras(extras):
+    pops = random_pops(0)
+    expected = np.array(old_apportion(pops, states)) - 2 + extras
+    assert list(rs.apportion_batch([pops], states, extras=extras)[0]) == list(expected)